@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+"""Loading objects one new()/save() at a time vs bulk_new()/bulk_upsert()
+
+Usage: python3 -m benchmarks.bench_bulk [count]
+
+Runs against the configured storage engine (HBNB_TYPE_STORAGE) inside a
+temporary directory: file mode writes its file there, and db mode always
+uses a throwaway SQLite database there (HBNB_DB_URL is overridden), so
+no real data is read or wiped.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+
+def per_object(storage, count):
+    """One new() and one save() per object"""
+    for i in range(count):
+        amenity = Amenity(name="Amenity {}".format(i))
+        storage.new(amenity)
+        storage.save()
+
+
+def bulk_new(storage, count):
+    """A single bulk_new() call"""
+    storage.bulk_new(Amenity(name="Amenity {}".format(i))
+                     for i in range(count))
+
+
+def bulk_upsert(storage, count):
+    """A single bulk_upsert() call with plain rows"""
+    storage.bulk_upsert(Amenity, ({"name": "Amenity {}".format(i)}
+                                  for i in range(count)))
+
+
+def clear(storage):
+    """Delete every Amenity so each run starts from the same point"""
+    for amenity in list(storage.all(Amenity).values()):
+        storage.delete(amenity)
+    storage.save()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        if os.environ.get("HBNB_TYPE_STORAGE") == "db":
+            os.environ["HBNB_DB_URL"] = \
+                "sqlite:///" + os.path.join(tmp, "bench.db")
+        # models creates and loads the storage on import: only after the
+        # chdir and the URL override
+        from models import storage
+        from models.amenity import Amenity
+        for name, load in (("per_object", per_object), ("bulk_new", bulk_new),
+                           ("bulk_upsert", bulk_upsert)):
+            clear(storage)
+            start = time.perf_counter()
+            load(storage, count)
+            elapsed = time.perf_counter() - start
+            print("{:<12} {:>9.3f} s  {:>9.1f} objects/s".format(
+                name, elapsed, count / elapsed))
+        clear(storage)
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+"""Bytes per object held by FileStorage: built instances vs columns
+
+Usage: python3 -m benchmarks.bench_memory [count]
+"""
+
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from models.place import Place
+from models.engine.column_store import ColumnTable
+
+
+def make_records(count):
+    """Return count Place records shaped like the ones in file.json"""
+    cities = [str(uuid.uuid4()) for _ in range(50)]
+    users = [str(uuid.uuid4()) for _ in range(200)]
+    # Non-zero microseconds: isoformat() drops them when they are 0 and
+    # the models only parse timestamps that have them
+    start = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    records = {}
+    for i in range(count):
+        place = Place()
+        place.created_at = place.updated_at = start + timedelta(seconds=i)
+        place.city_id = cities[i % len(cities)]
+        place.user_id = users[i % len(users)]
+        place.name = "Place {}".format(i)
+        place.number_rooms = i % 5
+        place.price_by_night = 50 + i % 200
+        place.latitude = 37.0 + i / count
+        place.longitude = -122.0 - i / count
+        records["Place." + place.id] = place.to_dict()
+    return records
+
+
+def measure(build, records):
+    """Return the bytes allocated by build(records) and kept alive"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = build(records)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return after - before
+
+
+def instances(records):
+    """Storage as today: one built model instance per record"""
+    return {key: Place(**record) for key, record in records.items()}
+
+
+def columns(records):
+    """Columnar mode: records kept in a ColumnTable"""
+    table = ColumnTable(Place)
+    for key, record in records.items():
+        table[key] = record
+    return table
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    records = make_records(count)
+    for name, build in (("instances", instances), ("columns", columns)):
+        size = measure(build, records)
+        print("{:<10} {:>12} bytes  {:>8.1f} bytes/object".format(
+            name, size, size / count))
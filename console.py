@@ -1,16 +1,200 @@
 #!/usr/bin/env python3
 """ Console Module """
 
+import ast
 import cmd
+import cProfile
+import csv
+import json
+import os
+import select
 import sys
+from contextlib import nullcontext
+from itertools import islice
+from time import perf_counter
 from models.base_model import BaseModel
-from models.__init__ import storage
+from models import storage
 from models.user import User
 from models.place import Place
 from models.state import State
 from models.city import City
 from models.amenity import Amenity
 from models.review import Review
+from models.engine.batch import chunked
+
+
+def parse_dict(text):
+    """Return text as a dict if it is a dict literal, else None
+
+    Only literals are accepted (ast.literal_eval), never code.
+    """
+    try:
+        value = ast.literal_eval(text.strip())
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def class_fields(cls):
+    """Attribute names of cls, in the order CSV exports write them"""
+    table = getattr(cls, '__table__', None)
+    if table is not None:
+        return [column.name for column in table.columns]
+    return ['id', 'created_at', 'updated_at'] + [
+        name for name, value in vars(cls).items()
+        if not name.startswith('_') and
+        isinstance(value, (str, int, float, list))]
+
+
+def coerce_value(cls, name, value):
+    """Convert a text value to the type of attribute name of cls
+
+    The type comes from HBNBCommand.types, then the column definition,
+    then the class default; lists are read as JSON.
+    """
+    if not isinstance(value, str):
+        return value
+    if name in HBNBCommand.types:
+        return HBNBCommand.types[name](value)
+    table = getattr(cls, '__table__', None)
+    if table is not None and name in table.columns:
+        try:
+            kind = table.columns[name].type.python_type
+        except NotImplementedError:
+            return value
+        return kind(value) if kind in (int, float) else value
+    default = getattr(cls, name, None)
+    if isinstance(default, bool):
+        return value.lower() in ('1', 'true', 'yes')
+    if isinstance(default, (int, float)):
+        return type(default)(value)
+    if isinstance(default, list):
+        return json.loads(value)
+    return value
+
+
+class BatchOutput:
+    """stdout wrapper numbering the "** ... **" errors of a batch run"""
+
+    def __init__(self, stream):
+        """Pass everything through to stream"""
+        self.stream = stream
+        self.lineno = 0
+        self.failed = set()
+        self.__line_start = True
+
+    def write(self, text):
+        """Prefix error messages with the number of the failing line"""
+        if self.__line_start and text.startswith(("** ", "*** ")):
+            self.stream.write("line {}: ".format(self.lineno))
+            self.failed.add(self.lineno)
+        if text:
+            self.__line_start = text.endswith("\n")
+        return self.stream.write(text)
+
+    def flush(self):
+        """Flush the wrapped stream"""
+        self.stream.flush()
+
+
+class StorageTimer:
+    """Times console commands and the storage calls they make
+
+    install() replaces the storage methods named in methods with timed
+    wrappers; calls made from inside another timed call are counted in
+    the outer one only. With profile_dir, every command also dumps a
+    cProfile file there.
+    """
+
+    methods = ('all', 'get', 'query', 'count', 'iter_all', 'new', 'save',
+               'delete', 'reload', 'bulk_new', 'bulk_upsert')
+
+    def __init__(self, profile_dir=None, out=None):
+        """Report on out (stderr by default)"""
+        self.profile_dir = profile_dir
+        self.out = out
+        self.calls = {}
+        self.__depth = 0
+        self.__commands = 0
+
+    def install(self):
+        """Wrap the storage methods"""
+        for name in self.methods:
+            method = getattr(storage, name, None)
+            if method is not None:
+                setattr(storage, name, self.__wrap(name, method))
+
+    def uninstall(self):
+        """Give storage its own methods back"""
+        for name in self.methods:
+            vars(storage).pop(name, None)
+
+    def __record(self, name, seconds, calls=1):
+        """Add calls and seconds to the totals of name"""
+        count, total = self.calls.get(name, (0, 0.0))
+        self.calls[name] = (count + calls, total + seconds)
+
+    def __wrap(self, name, method):
+        """Return method timed under name"""
+        def timed(*args, **kwargs):
+            if self.__depth:
+                return method(*args, **kwargs)
+            self.__depth += 1
+            start = perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self.__depth -= 1
+                self.__record(name, perf_counter() - start)
+            if name == 'iter_all':
+                return self.__timed_iter(result)
+            return result
+        return timed
+
+    def __timed_iter(self, iterator):
+        """Yield from iterator, adding the time spent in it to iter_all"""
+        while True:
+            self.__depth += 1
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.__depth -= 1
+                self.__record('iter_all', perf_counter() - start, calls=0)
+            yield item
+
+    def run(self, command, line, parse_time=0.0):
+        """Run command(line) and report its timings"""
+        self.calls = {}
+        self.__commands += 1
+        profiler = cProfile.Profile() if self.profile_dir else None
+        start = perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            return command(line)
+        finally:
+            if profiler:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                name = (line.split() or ['empty'])[0]
+                profiler.dump_stats(os.path.join(
+                    self.profile_dir, "{:04d}-{}.prof".format(
+                        self.__commands, "".join(
+                            c for c in name if c.isalnum()) or 'cmd')))
+            self.report(perf_counter() - start, parse_time)
+
+    def report(self, elapsed, parse_time):
+        """Print the wall time of a command and of its storage calls"""
+        out = self.out or sys.stderr
+        out.write("[timing] {:.3f} ms total, {:.3f} ms parsing\n".format(
+            elapsed * 1000, parse_time * 1000))
+        for name, (count, total) in sorted(self.calls.items(),
+                                           key=lambda item: -item[1][1]):
+            out.write("[timing]   {:<12} {:>5} call(s) {:>10.3f} ms\n"
+                      .format(name, count, total * 1000))
 
 
 class HBNBCommand(cmd.Cmd):
@@ -30,6 +214,45 @@ class HBNBCommand(cmd.Cmd):
         'latitude': float, 'longitude': float
     }
 
+    timer = None
+    __parse_started = None
+
+    def onecmd(self, line):
+        """Run one command, through the timer when timing is on"""
+        if self.timer is None or line.split()[:1] == ['timing']:
+            return super().onecmd(line)
+        parse_time = 0.0
+        if self.__parse_started is not None:
+            parse_time = perf_counter() - self.__parse_started
+            self.__parse_started = None
+        return self.timer.run(super().onecmd, line, parse_time)
+
+    def do_timing(self, args):
+        """ Turns per-command timing on or off """
+        tokens = args.split()
+        if not tokens:
+            print("timing is {}".format("on" if self.timer else "off"))
+            return
+        if tokens[0] not in ('on', 'off'):
+            print("** usage: timing on|off [--profile <dir>] **")
+            return
+        if HBNBCommand.timer:
+            HBNBCommand.timer.uninstall()
+            HBNBCommand.timer = None
+        if tokens[0] == 'on':
+            profile_dir = None
+            if '--profile' in tokens:
+                index = tokens.index('--profile') + 1
+                profile_dir = tokens[index] if index < len(tokens) \
+                    else 'profiles'
+            HBNBCommand.timer = StorageTimer(profile_dir)
+            HBNBCommand.timer.install()
+
+    def help_timing(self):
+        print("Reports the time of each command and of its storage calls")
+        print("[Usage]: timing on|off [--profile <dir>]")
+        print("--profile also dumps a cProfile file per command in <dir>\n")
+
     def preloop(self):
         """Prints if isatty is false"""
         if not sys.__stdin__ or not sys.__stdin__.isatty():
@@ -37,6 +260,7 @@ class HBNBCommand(cmd.Cmd):
 
     def precmd(self, line):
         """Reformat command line for advanced command syntax."""
+        self.__parse_started = perf_counter()
         _cmd = _cls = _id = _args = ''
 
         if not ('.' in line and '(' in line and ')' in line):
@@ -54,7 +278,8 @@ class HBNBCommand(cmd.Cmd):
                 _id = pline[0].replace('\"', '')
                 pline = pline[2].strip()
                 if pline:
-                    if pline[0] == '{' and pline[-1] == '}' and type(eval(pline)) is dict:
+                    if pline[0] == '{' and pline[-1] == '}' and \
+                            parse_dict(pline) is not None:
                         _args = pline
                     else:
                         _args = pline.replace(',', '')
@@ -88,6 +313,70 @@ class HBNBCommand(cmd.Cmd):
     def emptyline(self):
         pass
 
+    def do_source(self, args):
+        """ Runs the commands of a file inside one storage batch """
+        tokens = args.split()
+        path, every = '', None
+        while tokens:
+            token = tokens.pop(0)
+            if token.startswith('--every'):
+                value = token.partition('=')[2] or \
+                    (tokens.pop(0) if tokens else '')
+                try:
+                    every = int(value)
+                    if every <= 0:
+                        raise ValueError
+                except ValueError:
+                    print("** invalid number **")
+                    return
+            else:
+                path = path or token
+        if not path:
+            print("** file name missing **")
+            return
+        try:
+            lines = sys.stdin if path == '-' else open(path)
+        except OSError:
+            print("** can't read {} **".format(path))
+            return
+
+        stdout, cmd_stdout = sys.stdout, self.stdout
+        out = sys.stdout = self.stdout = BatchOutput(stdout)
+        count = 0
+        storage.begin()
+        try:
+            for out.lineno, line in enumerate(lines, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    # A command breaking a constraint fails here, alone
+                    with _savepoint():
+                        self.onecmd(self.precmd(line))
+                except Exception as e:
+                    print("** {} **".format(e))
+                count += 1
+                if every and count % every == 0:
+                    error = _commit()
+                    if error:
+                        print("** not persisted: {} **".format(error))
+                    storage.begin()
+        finally:
+            error = _commit()
+            sys.stdout, self.stdout = stdout, cmd_stdout
+            if lines is not sys.stdin:
+                lines.close()
+        if error:
+            print("** not persisted: {} **".format(error))
+        if out.failed:
+            print("** {} of {} commands failed **".format(
+                len(out.failed), count))
+
+    def help_source(self):
+        print("Runs the commands of a file, persisting once at the end")
+        print("[Usage]: source <file> [--every N]")
+        print("--every N persists after every N commands, - reads stdin\n")
+
     def do_create(self, args):
         """ Create an object of any class"""
         if not args:
@@ -182,8 +471,7 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-        obj = storage.all().get(key)
+        obj = storage.get(c_name, c_id)
         if obj:
             print(obj)
         else:
@@ -209,8 +497,7 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-        obj = storage.all().get(key)
+        obj = storage.get(c_name, c_id)
         if obj:
             storage.delete(obj)
             storage.save()
@@ -221,35 +508,77 @@ class HBNBCommand(cmd.Cmd):
         print("Destroys an individual instance of a class")
         print("[Usage]: destroy <className> <objectId>\n")
 
-    def do_all(self, args):
-        """ Shows all objects, or all objects of a class"""
-        print_list = []
+    def __listing_args(self, args):
+        """Parse [<className>] [--class C] [--limit N] [--offset N] [--stream]
+
+        Returns (class name, limit, offset, stream), or None after
+        printing the error.
+        """
+        tokens = args.split()
+        c_name, options = '', {}
+        while tokens:
+            token = tokens.pop(0)
+            if not token.startswith('--'):
+                c_name = c_name or token
+                continue
+            name, _, value = token[2:].partition('=')
+            if name == 'stream':
+                options[name] = True
+            elif name in ('class', 'limit', 'offset'):
+                options[name] = value or (tokens.pop(0) if tokens else '')
+            else:
+                print("** invalid option **")
+                return None
+        c_name = options.get('class', c_name)
+        if c_name and c_name not in HBNBCommand.classes:
+            print("** class doesn't exist **")
+            return None
+        try:
+            limit = options.get('limit')
+            limit = int(limit) if limit is not None else None
+            offset = int(options.get('offset', 0))
+            if offset < 0 or (limit is not None and limit < 0):
+                raise ValueError
+        except ValueError:
+            print("** invalid number **")
+            return None
+        return c_name, limit, offset, options.get('stream', False)
 
-        if args:
-            args = args.split(' ')[0]
-            if args not in HBNBCommand.classes:
-                print("** class doesn't exist **")
-                return
-            for k, v in storage.all().items():
-                if k.split('.')[0] == args:
-                    print_list.append(str(v))
-        else:
-            for v in storage.all().values():
-                print_list.append(str(v))
+    def do_all(self, args):
+        """ Shows all objects, or all objects of a class
 
-        print(print_list)
+        Objects are printed as they come from storage.iter_all(), so the
+        whole listing is never held in memory.
+        """
+        parsed = self.__listing_args(args)
+        if parsed is None:
+            return
+        c_name, limit, offset, stream = parsed
+        objects = islice(storage.iter_all(c_name or None), offset,
+                         offset + limit if limit is not None else None)
+        if stream:
+            for obj in objects:
+                print(obj)
+            return
+        # Same text as printing a list of the str() of every object
+        print('[', end='')
+        for i, obj in enumerate(objects):
+            print((', ' if i else '') + repr(str(obj)), end='')
+        print(']')
 
     def help_all(self):
         print("Shows all objects, or all of a class")
-        print("[Usage]: all <className>\n")
+        print("[Usage]: all [<className>] [--limit N] [--offset N]"
+              " [--stream]")
+        print("--stream prints one object per line, --class <className>"
+              " may replace <className>\n")
 
     def do_count(self, args):
         """Count current number of class instances"""
-        count = 0
-        for k in storage.all().keys():
-            if args == k.split('.')[0]:
-                count += 1
-        print(count)
+        parsed = self.__listing_args(args)
+        if parsed is None:
+            return
+        print(storage.count(parsed[0]) if parsed[0] else 0)
 
     def help_count(self):
         print("Usage: count <class_name>")
@@ -274,15 +603,15 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-        obj = storage.all().get(key)
+        obj = storage.get(c_name, c_id)
         if not obj:
             print("** no instance found **")
             return
 
         # determine if kwargs or args
-        if '{' in args[2] and '}' in args[2] and type(eval(args[2])) is dict:
-            kwargs = eval(args[2])
+        if '{' in args[2] and '}' in args[2]:
+            kwargs = parse_dict(args[2])
+        if isinstance(kwargs, dict):
             args = []
             for k, v in kwargs.items():
                 args.append(k)
@@ -322,6 +651,365 @@ class HBNBCommand(cmd.Cmd):
         print("Updates an object with new information")
         print("Usage: update <className> <id> <attName> <attVal>\n")
 
+    def __transfer_args(self, args):
+        """Parse <className> <file> [--format csv|jsonl] [--chunk N]
+
+        Returns (class, path, format, chunk), or None after printing the
+        error. The format defaults to csv for .csv files, jsonl otherwise.
+        """
+        tokens = args.split()
+        positional, options = [], {}
+        while tokens:
+            token = tokens.pop(0)
+            if not token.startswith('--'):
+                positional.append(token)
+                continue
+            name, _, value = token[2:].partition('=')
+            if name not in ('format', 'chunk'):
+                print("** invalid option **")
+                return None
+            options[name] = value or (tokens.pop(0) if tokens else '')
+        if not positional:
+            print("** class name missing **")
+            return None
+        if positional[0] not in HBNBCommand.classes:
+            print("** class doesn't exist **")
+            return None
+        if len(positional) < 2:
+            print("** file name missing **")
+            return None
+        path = positional[1]
+        fmt = options.get('format') or \
+            ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        if fmt not in ('csv', 'jsonl'):
+            print("** unknown format **")
+            return None
+        try:
+            chunk = int(options.get('chunk', 1000))
+            if chunk <= 0:
+                raise ValueError
+        except ValueError:
+            print("** invalid number **")
+            return None
+        return HBNBCommand.classes[positional[0]], path, fmt, chunk
+
+    def do_import(self, args):
+        """ Loads objects of a class from a CSV or JSON-lines file """
+        parsed = self.__transfer_args(args)
+        if parsed is None:
+            return
+        cls, path, fmt, chunk = parsed
+        try:
+            f = open(path, newline='')
+        except OSError:
+            print("** can't read {} **".format(path))
+            return
+
+        def records():
+            """(line number, record) pairs, None for unreadable lines"""
+            if fmt == 'csv':
+                reader = csv.DictReader(f)
+                for record in reader:
+                    yield reader.line_num, record
+                return
+            for lineno, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield lineno, json.loads(line)
+                    except ValueError:
+                        yield lineno, None
+
+        def rows():
+            """(line number, coerced row) pairs, skipping the bad ones"""
+            for lineno, record in records():
+                try:
+                    if not isinstance(record, dict):
+                        raise ValueError("invalid record")
+                    yield lineno, {name: coerce_value(cls, name, value)
+                                   for name, value in record.items()
+                                   if name and value not in ('', None) and
+                                   name != '__class__'}
+                except ValueError as e:
+                    print("** {}:{}: {} **".format(path, lineno, e))
+
+        count = 0
+        with f:
+            for rows_chunk in chunked(rows(), chunk):
+                # A chunk the database refuses is undone and skipped
+                storage.begin()
+                try:
+                    with _savepoint():
+                        done = storage.bulk_upsert(
+                            cls, [row for _, row in rows_chunk])
+                except Exception as e:
+                    _commit()
+                    error = e
+                else:
+                    error = _commit()
+                if error:
+                    print("** {}:{}-{}: {} **".format(
+                        path, rows_chunk[0][0], rows_chunk[-1][0], error))
+                else:
+                    count += done
+        print(count)
+
+    def help_import(self):
+        print("Creates or updates objects of a class from a file")
+        print("[Usage]: import <className> <file> [--format csv|jsonl]"
+              " [--chunk N]")
+        print("Rows are committed N at a time (default 1000), a chunk"
+              " that fails is reported and skipped\n")
+
+    def do_export(self, args):
+        """ Writes the objects of a class to a CSV or JSON-lines file """
+        parsed = self.__transfer_args(args)
+        if parsed is None:
+            return
+        cls, path, fmt, chunk = parsed
+        try:
+            f = open(path, 'w', newline='')
+        except OSError:
+            print("** can't write {} **".format(path))
+            return
+        count = 0
+        with f:
+            if fmt == 'csv':
+                writer = csv.DictWriter(f, class_fields(cls),
+                                        extrasaction='ignore')
+                writer.writeheader()
+            for obj in storage.iter_all(cls.__name__, batch_size=chunk):
+                record = obj.to_dict()
+                del record['__class__']
+                if fmt == 'csv':
+                    writer.writerow({name: json.dumps(value)
+                                     if isinstance(value, list) else value
+                                     for name, value in record.items()})
+                else:
+                    f.write(json.dumps(record, default=str) + '\n')
+                count += 1
+        print(count)
+
+    def help_export(self):
+        print("Writes every object of a class to a file")
+        print("[Usage]: export <className> <file> [--format csv|jsonl]\n")
+
+
+def _commit():
+    """Commit the open storage batch, rolling it back if that fails
+
+    Returns the exception raised by the commit, None once persisted.
+    """
+    try:
+        storage.commit()
+    except Exception as e:
+        rollback = getattr(storage, "rollback", None)
+        if rollback:
+            rollback()
+        return e
+    return None
+
+
+def _savepoint():
+    """storage.savepoint() where the engine has one, else a no-op"""
+    savepoint = getattr(storage, "savepoint", None)
+    return savepoint() if savepoint else nullcontext()
+
+
+def _input_pending(stream):
+    """True unless reading stream now would wait for its writer"""
+    try:
+        return bool(select.select([stream], [], [], 0)[0])
+    except (OSError, ValueError):
+        # Not a pipe or file (e.g. StringIO): everything is already there
+        return True
+
+
+class JsonlProtocol:
+    """One JSON request per input line, one JSON response per output line
+
+    Requests name a command and its arguments, an optional id is echoed:
+
+        {"id": 1, "cmd": "create", "class": "Place", "attrs": {"name": "x"}}
+        {"id": 1, "ok": true, "result": "<new id>"}
+
+    Commands are create (class, attrs), show, destroy and update (class,
+    instance, plus attrs for update), all (optional class, limit, offset)
+    and count (class). Failures answer
+    {"ok": false, "error": "<message>"}. Requests are run in storage
+    batches: the batch is persisted when batch_size requests were read,
+    no more input is waiting or a request failed, and its responses are
+    only written once it is. Engines with savepoints run each write in
+    one, so a write breaking a constraint fails and is undone alone.
+    When persisting fails the batch is rolled back where the engine
+    can, and its writes answer the error.
+    """
+
+    writes = ("create", "update", "destroy")
+
+    def __init__(self, batch_size=1000):
+        """Flush at least every batch_size requests"""
+        self.batch_size = batch_size
+
+    def run(self, lines, out):
+        """Answer every request of lines on out"""
+        responses = []
+        storage.begin()
+        try:
+            for line in lines:
+                if not line.strip():
+                    continue
+                response, write = self.respond(line)
+                responses.append((response, write))
+                if not response["ok"] or \
+                        len(responses) >= self.batch_size or \
+                        not _input_pending(lines):
+                    self.flush(responses, out)
+                    responses = []
+                    storage.begin()
+        finally:
+            self.flush(responses, out)
+
+    @staticmethod
+    def flush(responses, out):
+        """Persist the open batch, then write its (response, write) pairs"""
+        error = _commit()
+        if error:
+            error = "not persisted: {}".format(error)
+            failed = []
+            for response, write in responses:
+                if write and response["ok"]:
+                    response = {key: value for key, value in response.items()
+                                if key != "result"}
+                    response.update(ok=False, error=error)
+                failed.append((response, write))
+            responses = failed
+        out.write("".join(json.dumps(response) + "\n"
+                          for response, _ in responses))
+        out.flush()
+
+    def respond(self, line):
+        """Return the response to one request line and if it was a write
+
+        Any error raised by a request fails that request only.
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "invalid request"}, False
+        handler = {"create": self.create, "show": self.show,
+                   "update": self.update, "destroy": self.destroy,
+                   "all": self.all, "count": self.count
+                   }.get(request.get("cmd"))
+        write = request.get("cmd") in self.writes
+        try:
+            if handler is None:
+                raise ValueError("unknown command")
+            with _savepoint() if write else nullcontext():
+                result = handler(request)
+            response = {"ok": True, "result": result}
+        except Exception as e:
+            response = {"ok": False, "error": str(e) or type(e).__name__}
+        if "id" in request:
+            response = dict(id=request["id"], **response)
+        return response, write
+
+    def answer(self, line):
+        """Return the response line to one request line"""
+        return json.dumps(self.respond(line)[0]) + "\n"
+
+    @staticmethod
+    def cls(request):
+        """The model class named by the request"""
+        c_name = request.get("class")
+        if not c_name:
+            raise ValueError("class name missing")
+        if c_name not in HBNBCommand.classes:
+            raise ValueError("class doesn't exist")
+        return HBNBCommand.classes[c_name]
+
+    def instance(self, request):
+        """The object named by the request's class and id"""
+        cls = self.cls(request)
+        if not request.get("instance"):
+            raise ValueError("instance id missing")
+        obj = storage.get(cls.__name__, request["instance"])
+        if obj is None:
+            raise ValueError("no instance found")
+        return obj
+
+    @staticmethod
+    def attrs(request):
+        """The request's attributes, numbers coerced like the console"""
+        attrs = request.get("attrs") or {}
+        if not isinstance(attrs, dict):
+            raise ValueError("attrs must be an object")
+        return {name: HBNBCommand.types[name](value)
+                if name in HBNBCommand.types else value
+                for name, value in attrs.items()}
+
+    def create(self, request):
+        """Create an object, return its id"""
+        cls = self.cls(request)
+        attrs = self.attrs(request)
+        required = {"State": ("name",), "City": ("name", "state_id")}
+        for name in required.get(cls.__name__, ()):
+            if name not in attrs:
+                raise ValueError(name + " missing")
+        obj = cls(**attrs)
+        obj.save()
+        return obj.id
+
+    def show(self, request):
+        """Return the object as a dict"""
+        return self.instance(request).to_dict()
+
+    def update(self, request):
+        """Set the request's attributes on the object"""
+        obj = self.instance(request)
+        for name, value in self.attrs(request).items():
+            setattr(obj, name, value)
+        obj.save()
+        return obj.to_dict()
+
+    def destroy(self, request):
+        """Delete the object"""
+        storage.delete(self.instance(request))
+        storage.save()
+        return None
+
+    def all(self, request):
+        """Return the objects (of a class) as dicts"""
+        c_name = self.cls(request).__name__ if request.get("class") else None
+        offset = int(request.get("offset") or 0)
+        limit = request.get("limit")
+        objects = islice(storage.iter_all(c_name), offset,
+                         offset + int(limit) if limit is not None else None)
+        return [obj.to_dict() for obj in objects]
+
+    def count(self, request):
+        """Return the number of objects of a class"""
+        return storage.count(self.cls(request).__name__)
+
 
 if __name__ == "__main__":
-    HBNBCommand().cmdloop()
+    if getattr(storage, "awaitable", False):
+        sys.exit("** the console needs a synchronous storage engine, "
+                 "not {} **".format(type(storage).__name__))
+    if len(sys.argv) > 1 and sys.argv[1] == "--profile":
+        # ./console.py --profile [<dir>] [--batch ...]: timing on, with
+        # a cProfile dump per command
+        del sys.argv[1]
+        profile_dir = 'profiles'
+        if len(sys.argv) > 1 and not sys.argv[1].startswith('--'):
+            profile_dir = sys.argv.pop(1)
+        HBNBCommand.timer = StorageTimer(profile_dir)
+        HBNBCommand.timer.install()
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        # ./console.py --batch <file> [--every N]
+        HBNBCommand().do_source(' '.join(sys.argv[2:]) or '-')
+    elif len(sys.argv) > 1 and sys.argv[1] == "--jsonl":
+        JsonlProtocol().run(sys.stdin, sys.stdout)
+    else:
+        HBNBCommand().cmdloop()
@@ -9,8 +9,33 @@ storage_type = getenv("HBNB_TYPE_STORAGE")
 if storage_type == "db":
     from models.engine.db_storage import DBStorage
     storage = DBStorage()
+    if getenv("HBNB_CACHE_SIZE"):
+        from models.engine.cache import CachedStorage
+        ttl = getenv("HBNB_CACHE_TTL")
+        max_bytes = getenv("HBNB_CACHE_BYTES")
+        storage = CachedStorage(
+            storage, size=int(getenv("HBNB_CACHE_SIZE")),
+            ttl=float(ttl) if ttl else None,
+            max_bytes=int(max_bytes) if max_bytes else None)
+elif storage_type == "async_db":
+    from models.engine.async_db_storage import AsyncDBStorage
+    storage = AsyncDBStorage()
 else:
     from models.engine.file_storage import FileStorage
     storage = FileStorage()
 
-storage.reload()
+if storage_type == "async_db":
+    # AsyncDBStorage.reload() is a coroutine awaited by its users
+    pass
+elif storage_type != "db" and getenv("HBNB_FILE_LAYOUT") == "sharded":
+    # Shards are read on first use; HBNB_FILE_PRELOAD lists any to read now
+    preload = getenv("HBNB_FILE_PRELOAD", "")
+    storage.reload([name.strip() for name in preload.split(",")
+                    if name.strip()])
+else:
+    storage.reload()
+
+if getenv("HBNB_METRICS_FILE") and storage_type != "async_db":
+    from models.engine.metrics import MetricsWriter
+    MetricsWriter(storage, getenv("HBNB_METRICS_FILE"),
+                  float(getenv("HBNB_METRICS_INTERVAL", 15))).start()
@@ -7,6 +7,8 @@ from sqlalchemy.orm import relationship
 from os import getenv
 
 STORAGE_TYPE = getenv("HBNB_TYPE_STORAGE")
+if STORAGE_TYPE == "async_db":
+    STORAGE_TYPE = "db"  # same mapped classes as DBStorage
 
 
 class Amenity(BaseModel, Base if STORAGE_TYPE == "db" else object):
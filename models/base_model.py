@@ -9,35 +9,64 @@ from sqlalchemy import Column, String, DateTime
 Base = declarative_base()
 
 
+def _sync_storage(method):
+    """Return models.storage, refusing an engine whose calls are awaitable"""
+    from models import storage
+    if getattr(storage, "awaitable", False):
+        raise RuntimeError(
+            "{}() cannot persist through {}: await storage.new(obj) and "
+            "storage.save() (or storage.delete(obj)) instead".format(
+                method, type(storage).__name__))
+    return storage
+
+
 class BaseModel:
     """Defines common attributes/methods for all models"""
 
     id = Column(String(60), primary_key=True, nullable=False)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
-    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow,
+                        index=True)
 
     def __init__(self, *args, **kwargs):
         """Initialize instance"""
         from models import storage
+        # Not stored yet, so skip the change tracking of __setattr__
+        set_attr = super().__setattr__
 
         if kwargs:
             kwargs.pop("__class__", None)
             for key, value in kwargs.items():
                 if key in ["created_at", "updated_at"]:
                     if isinstance(value, str):
-                        setattr(self, key, datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f"))
+                        set_attr(key, datetime.strptime(
+                            value, "%Y-%m-%dT%H:%M:%S.%f"))
                 else:
-                    setattr(self, key, value)
+                    set_attr(key, value)
             if "id" not in kwargs:
-                self.id = str(uuid.uuid4())
+                set_attr("id", str(uuid.uuid4()))
             if "create_at" not in kwargs:
-                self.created_at = datetime.utcnow()
+                set_attr("created_at", datetime.utcnow())
             if "updated_at" not in kwargs:
-                self.updated_at = datetime.utcnow()
+                set_attr("updated_at", datetime.utcnow())
         else:
-            self.id = str(uuid.uuid4())
-            self.created_at = datetime.utcnow()
-            self.updated_at = datetime.utcnow()
+            set_attr("id", str(uuid.uuid4()))
+            set_attr("created_at", datetime.utcnow())
+            set_attr("updated_at", datetime.utcnow())
+
+    def __setattr__(self, name, value):
+        """Set an attribute, telling storage if it tracks this object
+
+        FileStorage puts its changed() hook in _storage_changed when it
+        stores the object; other objects only pay for this lookup.
+        """
+        changed = self.__dict__.get("_storage_changed")
+        if changed is None:
+            super().__setattr__(name, value)
+            return
+        old = self.__dict__.get(name)
+        super().__setattr__(name, value)
+        changed(self, name, old)
 
     def __str__(self):
         """String representation of the instance"""
@@ -49,15 +78,14 @@ class BaseModel:
     
     def save(self):
         """Update update_at and save to storage"""
-        from models import storage
+        storage = _sync_storage("save")
         self.updated_at = datetime.utcnow()
         storage.new(self)
         storage.save()
 
     def delete(self):
         """Delete the instance from storage"""
-        from models import storage
-        storage.delete(self)
+        _sync_storage("delete").delete(self)
 
     def to_dict(self):
         """Return dict representation"""
@@ -66,4 +94,5 @@ class BaseModel:
         dictionary["created_at"] = self.created_at.isoformat()
         dictionary["updated_at"] = self.updated_at.isoformat()
         dictionary.pop("_sa_instance_state", None)
+        dictionary.pop("_storage_changed", None)
         return dictionary
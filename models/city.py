@@ -9,7 +9,8 @@ from models.base_model import BaseModel, Base
 class City(BaseModel, Base):
     __tablename__ = "cities"
 
-    state_id = Column(String(60), ForeignKey("states.id"), nullable=False)
+    state_id = Column(String(60), ForeignKey("states.id"), nullable=False,
+                      index=True)
     name = Column(String(128), nullable=False)
 
     # Relationship with place
@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+"""AsyncDBStorage engine for HBNB clone using SQLAlchemy's asyncio extension
+
+Selected with HBNB_TYPE_STORAGE=async_db. Every method that talks to the
+database is a coroutine, including reload(), which is therefore not
+called when models is imported:
+
+    from models import storage
+    await storage.reload()
+    await storage.new(state)
+    await storage.save()
+    cities = (await storage.get(State, state_id, load="cities")).cities
+
+Relationships cannot be lazy loaded from async code, ask for them with
+load= instead. Each asyncio task gets its own session.
+
+Only the engine is asynchronous: BaseModel.save() and delete() and the
+console need a synchronous engine and raise (or exit) under this one,
+rather than leave coroutines unawaited. Batches, write-behind, iter_all()
+and bulk_new()/bulk_upsert() are DBStorage features this engine does not
+offer; write many objects with new() and one save().
+"""
+
+import asyncio
+from os import getenv
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import (async_scoped_session,
+                                    async_sessionmaker, create_async_engine)
+from models.base_model import Base
+from models.engine.db_storage import (classes, load_options, pool_options,
+                                      select_query, sqlite_url, tune_sqlite)
+
+
+class AsyncDBStorage:
+    """Awaitable counterpart of DBStorage"""
+    __engine = None
+    __session = None
+    # Tells synchronous callers not to use this engine
+    awaitable = True
+
+    def __init__(self):
+        """Create the engine from HBNB_DB_URL or the HBNB_MYSQL_* variables"""
+        user = getenv("HBNB_MYSQL_USER")
+        pwd = getenv("HBNB_MYSQL_PWD")
+        host = getenv("HBNB_MYSQL_HOST")
+        db = getenv("HBNB_MYSQL_DB")
+        url = getenv("HBNB_DB_URL")
+        if not url and user and pwd and host and db:
+            url = f"mysql+aiomysql://{user}:{pwd}@{host}/{db}"
+        if url:
+            options = {}
+            for option, (name, kind) in pool_options.items():
+                if getenv(name):
+                    options[option] = kind(getenv(name))
+            if url.startswith("sqlite"):
+                self.__engine = create_async_engine(sqlite_url(url),
+                                                    **options)
+                tune_sqlite(self.__engine.sync_engine)
+            else:
+                self.__engine = create_async_engine(url, pool_pre_ping=True,
+                                                    **options)
+
+    @staticmethod
+    def __types(cls):
+        """Mapped classes named by cls, every class if None"""
+        if not cls:
+            return list(classes.values())
+        cls_type = classes.get(cls) if isinstance(cls, str) else cls
+        return [cls_type] if cls_type is not None else []
+
+    async def all(self, cls=None, load=None):
+        """Return a dict of "<class>.<id>" to object for cls or every class"""
+        obj_dict = {}
+        if self.__session:
+            for cls_type in self.__types(cls):
+                stmt = select(cls_type).options(
+                    *load_options(cls_type, load, strict=cls is not None))
+                for obj in (await self.__session.scalars(stmt)).all():
+                    obj_dict[f"{type(obj).__name__}.{obj.id}"] = obj
+        return obj_dict
+
+    async def get(self, cls, id, load=None):
+        """Return the object of cls with primary key id, or None"""
+        types = self.__types(cls) if cls else []
+        if not self.__session or not types:
+            return None
+        return await self.__session.get(
+            types[0], id, options=load_options(types[0], load))
+
+    async def count(self, cls=None):
+        """Return the number of rows of cls (or of every class)"""
+        if not self.__session:
+            return 0
+        total = 0
+        for cls_type in self.__types(cls):
+            total += await self.__session.scalar(
+                select(func.count()).select_from(cls_type))
+        return total
+
+    async def query(self, cls, order_by=None, limit=None, offset=0,
+                    load=None, **filters):
+        """Return the objects of cls matching filters, filtered in SQL"""
+        types = self.__types(cls) if cls else []
+        if not self.__session or not types:
+            return []
+        return (await self.__session.scalars(select_query(
+            types[0], filters, order_by, limit, offset, load))).all()
+
+    async def new(self, obj):
+        """Add obj to the current task's session"""
+        if self.__session:
+            self.__session.add(obj)
+
+    async def save(self):
+        """Commit the current task's session"""
+        if self.__session:
+            await self.__session.commit()
+
+    async def rollback(self):
+        """Roll the current task's session back"""
+        if self.__session:
+            await self.__session.rollback()
+
+    async def delete(self, obj=None):
+        """Delete obj from the current task's session"""
+        if self.__session and obj:
+            await self.__session.delete(obj)
+
+    async def reload(self):
+        """Create the tables and the per-task session registry"""
+        if self.__engine:
+            async with self.__engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            factory = async_sessionmaker(bind=self.__engine,
+                                         expire_on_commit=False)
+            self.__session = async_scoped_session(
+                factory, scopefunc=asyncio.current_task)
+
+    async def close(self):
+        """Release the current task's session"""
+        if self.__session:
+            await self.__session.remove()
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+"""Write coalescing shared by the storage engines"""
+
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+
+def chunked(iterable, size):
+    """Yield lists of at most size items taken from iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Batcher:
+    """Turns storage save() calls into as few persists as possible
+
+    Inside begin()/commit() or a batch() block, save() only records that
+    a persist is owed and the persist runs once when the outermost batch
+    ends. With an interval, saves outside a batch are written behind:
+    by a daemon thread every interval seconds when background is true,
+    otherwise by the first save() once interval seconds have passed.
+    Owed writes are flushed at interpreter exit, or by close() when
+    at_exit is false.
+    """
+
+    def __init__(self, persist, rollback=None, interval=None,
+                 background=True, at_exit=True):
+        """Wrap the engine's real persist (and optional rollback)"""
+        self.__persist = persist
+        self.__rollback = rollback
+        self.__interval = interval
+        self.__depth = 0
+        self.__owed = False
+        self.__last = time.monotonic()
+        self.__lock = threading.RLock()
+        self.__stop = threading.Event()
+        if interval:
+            if at_exit:
+                atexit.register(self.flush)
+            if background:
+                threading.Thread(target=self.__write_behind,
+                                 daemon=True).start()
+
+    @property
+    def active(self):
+        """True while inside a batch"""
+        return self.__depth > 0
+
+    def defer(self):
+        """Record a save, return True if the persist can be put off"""
+        with self.__lock:
+            if self.__depth:
+                self.__owed = True
+                return True
+            if self.__interval and \
+                    time.monotonic() - self.__last < self.__interval:
+                self.__owed = True
+                return True
+            self.__owed = False
+            self.__last = time.monotonic()
+            return False
+
+    def begin(self):
+        """Open a (possibly nested) batch"""
+        with self.__lock:
+            self.__depth += 1
+
+    def commit(self):
+        """Close a batch, persisting once when the outermost one ends"""
+        with self.__lock:
+            if self.__depth:
+                self.__depth -= 1
+            if not self.__depth:
+                self.flush()
+
+    def rollback(self):
+        """Close every open batch and drop what they owe"""
+        with self.__lock:
+            self.__depth = 0
+            self.__owed = False
+            if self.__rollback:
+                self.__rollback()
+
+    @contextmanager
+    def batch(self):
+        """Context manager around begin() and commit()
+
+        Engines that can roll back do so when the block raises; the
+        others persist what the block already changed in memory.
+        """
+        self.begin()
+        try:
+            yield
+        except BaseException:
+            if self.__rollback:
+                self.rollback()
+            else:
+                self.commit()
+            raise
+        self.commit()
+
+    def flush(self):
+        """Persist now if a save is owed"""
+        with self.__lock:
+            if not self.__owed:
+                return
+            self.__owed = False
+            self.__last = time.monotonic()
+            self.__persist()
+
+    def close(self):
+        """Stop the write-behind thread after a last flush"""
+        self.__stop.set()
+        self.flush()
+
+    def __write_behind(self):
+        """Flush owed writes every interval seconds"""
+        while not self.__stop.wait(self.__interval):
+            with self.__lock:
+                if self.__depth:
+                    continue
+                self.flush()
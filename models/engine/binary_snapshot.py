@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+"""Compact binary snapshot format for FileStorage
+
+Layout, all integers little endian:
+
+    header   magic b"HBNB", version (u16), class count (u16),
+             offset of the offset table (u64)
+    records  one compact JSON document per object, grouped per class
+    table    per class: name length (u16), name, record count (u32),
+             then per record: key length (u16), key, offset (u64),
+             length (u32)
+
+Only the header and the offset table are parsed when a snapshot is
+opened; records are decoded from the memory map on demand.
+
+Usage: python3 -m models.engine.binary_snapshot <source> <destination>
+converts between file.json and the binary format, picking the direction
+from the magic bytes of <source>.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"HBNB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+NAME = struct.Struct("<H")
+COUNT = struct.Struct("<I")
+ENTRY = struct.Struct("<QI")
+
+
+def is_binary(path):
+    """Return True if path starts with the binary snapshot magic"""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class BinarySnapshot:
+    """Read-only, memory-mapped view of a binary snapshot"""
+
+    def __init__(self, path):
+        """Map path and parse its offset table"""
+        self.path = path
+        self.index = {}
+        self.__file = open(path, 'rb')
+        self.__map = mmap.mmap(self.__file.fileno(), 0,
+                               access=mmap.ACCESS_READ)
+        magic, version, count, pos = HEADER.unpack_from(self.__map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a binary snapshot")
+        data = self.__map
+        for _ in range(count):
+            size, = NAME.unpack_from(data, pos)
+            pos += NAME.size
+            cls_name = data[pos:pos + size].decode()
+            pos += size
+            records, = COUNT.unpack_from(data, pos)
+            pos += COUNT.size
+            entries = self.index.setdefault(cls_name, {})
+            for _ in range(records):
+                size, = NAME.unpack_from(data, pos)
+                pos += NAME.size
+                key = data[pos:pos + size].decode()
+                pos += size
+                entries[key] = ENTRY.unpack_from(data, pos)
+                pos += ENTRY.size
+
+    def raw(self, offset, length):
+        """Return the encoded bytes of the record at offset"""
+        return self.__map[offset:offset + length]
+
+    def record(self, offset, length):
+        """Decode the record at offset into a dictionary"""
+        return json.loads(self.__map[offset:offset + length])
+
+    def records(self):
+        """Yield (key, dict) for every record in the snapshot"""
+        for entries in self.index.values():
+            for key, (offset, length) in entries.items():
+                yield key, self.record(offset, length)
+
+    def close(self):
+        """Unmap the snapshot and close its file"""
+        self.__map.close()
+        self.__file.close()
+
+
+def write(path, records):
+    """Atomically write records to path as a binary snapshot
+
+    records maps "<Class>.<id>" keys to either a dictionary or the
+    already encoded bytes of a record, as returned by raw().
+    """
+    by_class = {}
+    for key, record in records.items():
+        by_class.setdefault(key.split('.', 1)[0], []).append((key, record))
+    table = []
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(by_class), 0))
+        offset = HEADER.size
+        for cls_name, entries in by_class.items():
+            table.append(NAME.pack(len(cls_name.encode())) + cls_name.encode()
+                         + COUNT.pack(len(entries)))
+            for key, record in entries:
+                if isinstance(record, dict):
+                    record = json.dumps(record, separators=(',', ':')).encode()
+                f.write(record)
+                table.append(NAME.pack(len(key.encode())) + key.encode()
+                             + ENTRY.pack(offset, len(record)))
+                offset += len(record)
+        f.write(b"".join(table))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, len(by_class), offset))
+    os.replace(tmp, path)
+
+
+def convert(source, destination):
+    """Convert source between the JSON and binary snapshot formats"""
+    if is_binary(source):
+        snapshot = BinarySnapshot(source)
+        records = dict(snapshot.records())
+        snapshot.close()
+        with open(destination, 'w') as f:
+            json.dump(records, f, indent=4)
+    else:
+        with open(source, 'r') as f:
+            write(destination, json.load(f))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: {} <source> <destination>".format(sys.argv[0]))
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2])
@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+"""Read-through cache in front of a storage engine
+
+CachedStorage wraps an engine (normally DBStorage) and keeps the results
+of get() and query() in a bounded LRU, optionally expiring them after a
+TTL and evicting to stay under a memory budget. Every other attribute is
+forwarded to the wrapped engine.
+
+Cached objects are the live objects of the session that loaded them, so
+attribute changes show through; what goes stale is which objects match.
+DBStorage gives each thread its own session, so entries are scoped to
+the thread that loaded them and a thread never gets objects attached to
+another thread's session. Invalidation reaches every thread: new(),
+delete() and bulk_upsert() drop the entries of the class they touch,
+save() drops every query() result, and bulk_new() and rollback() drop
+everything. close() drops the calling thread's entries.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def _sizeof(value):
+    """Rough number of bytes held by a cached result"""
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(map(_sizeof, value))
+    size = sys.getsizeof(value)
+    attrs = getattr(value, "__dict__", None)
+    if attrs is not None:
+        size += sys.getsizeof(attrs) + sum(map(sys.getsizeof, attrs.values()))
+    return size
+
+
+def _freeze(value):
+    """Hashable form of a filter value"""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(map(_freeze, value))
+    return value
+
+
+class CachedStorage:
+    """Storage engine wrapper caching get() and query() results"""
+
+    def __init__(self, storage, size=1024, ttl=None, max_bytes=None):
+        """Wrap storage, keeping at most size entries and max_bytes bytes"""
+        self.__storage = storage
+        self.__size = size
+        self.__ttl = ttl
+        self.__max_bytes = max_bytes
+        self.__entries = OrderedDict()
+        self.__bytes = 0
+        self.__lock = threading.RLock()
+        self.__local = threading.local()
+        self.__hits = self.__misses = self.__evictions = 0
+
+    def __getattr__(self, name):
+        """Forward everything not cached to the wrapped engine"""
+        return getattr(self.__storage, name)
+
+    def __scope(self):
+        """Token of the calling thread, never reused by another thread"""
+        scope = getattr(self.__local, "scope", None)
+        if scope is None:
+            scope = self.__local.scope = object()
+        return scope
+
+    @staticmethod
+    def __cls_name(cls):
+        """Name of cls, given as a class or a string"""
+        return cls if isinstance(cls, str) else cls.__name__
+
+    def __lookup(self, key, load):
+        """Return the cached value of key, or call load() and cache it"""
+        try:
+            hash(key)
+        except TypeError:
+            return load()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                value, expires, size = entry
+                if expires is None or time.monotonic() < expires:
+                    self.__entries.move_to_end(key)
+                    self.__hits += 1
+                    return value
+                self.__drop(key)
+            self.__misses += 1
+        value = load()
+        size = _sizeof(value)
+        if self.__max_bytes is not None and size > self.__max_bytes:
+            return value
+        expires = time.monotonic() + self.__ttl if self.__ttl else None
+        with self.__lock:
+            if key in self.__entries:
+                self.__drop(key)
+            self.__entries[key] = (value, expires, size)
+            self.__bytes += size
+            while len(self.__entries) > self.__size or \
+                    (self.__max_bytes is not None and
+                     self.__bytes > self.__max_bytes):
+                self.__drop(next(iter(self.__entries)))
+                self.__evictions += 1
+        return value
+
+    def __drop(self, key):
+        """Remove one entry, the caller holds the lock"""
+        self.__bytes -= self.__entries.pop(key)[2]
+
+    def __invalidate(self, cls_name=None, kind=None, scope=None):
+        """Drop the entries of cls_name (every class if None) and kind
+
+        Only the entries of scope are dropped when it is given.
+        """
+        with self.__lock:
+            for key in [key for key in self.__entries
+                        if (scope is None or key[0] is scope) and
+                        (cls_name is None or key[2] == cls_name) and
+                        (kind is None or key[1] == kind)]:
+                self.__drop(key)
+
+    def get(self, cls, id, load=None):
+        """Cached get()"""
+        key = (self.__scope(), "get", self.__cls_name(cls), id,
+               _freeze(load))
+        return self.__lookup(
+            key, lambda: self.__storage.get(cls, id, load=load))
+
+    def query(self, cls, order_by=None, limit=None, offset=0, load=None,
+              **filters):
+        """Cached query(), callers get their own copy of the list"""
+        key = (self.__scope(), "query", self.__cls_name(cls),
+               tuple(sorted((name, _freeze(value))
+                            for name, value in filters.items())),
+               _freeze(order_by), limit, offset, _freeze(load))
+        return list(self.__lookup(key, lambda: self.__storage.query(
+            cls, order_by=order_by, limit=limit, offset=offset, load=load,
+            **filters)))
+
+    def new(self, obj):
+        """Add obj, dropping the cached results of its class"""
+        self.__invalidate(type(obj).__name__)
+        self.__storage.new(obj)
+
+    def delete(self, obj=None):
+        """Delete obj, dropping the cached results of its class"""
+        if obj is not None:
+            self.__invalidate(type(obj).__name__)
+        self.__storage.delete(obj)
+
+    def bulk_new(self, objs, **kwargs):
+        """bulk_new(), dropping every cached result"""
+        self.clear()
+        return self.__storage.bulk_new(objs, **kwargs)
+
+    def bulk_upsert(self, cls, rows, **kwargs):
+        """bulk_upsert(), dropping the cached results of cls"""
+        self.__invalidate(self.__cls_name(cls))
+        return self.__storage.bulk_upsert(cls, rows, **kwargs)
+
+    def rollback(self):
+        """Roll back, dropping every cached result"""
+        self.clear()
+        self.__storage.rollback()
+
+    def save(self):
+        """Save, dropping every cached query() result"""
+        self.__invalidate(kind="query")
+        self.__storage.save()
+
+    def close(self):
+        """Close the wrapped engine's session, dropping its entries"""
+        self.__invalidate(scope=self.__scope())
+        close = getattr(self.__storage, "close", None)
+        if close:
+            close()
+
+    def clear(self):
+        """Empty the cache, keeping the statistics"""
+        self.__invalidate()
+
+    def cache_info(self):
+        """Hit, miss and eviction counts with the current entries and bytes"""
+        with self.__lock:
+            return {"hits": self.__hits, "misses": self.__misses,
+                    "evictions": self.__evictions,
+                    "entries": len(self.__entries), "bytes": self.__bytes,
+                    "max_entries": self.__size,
+                    "max_bytes": self.__max_bytes}
@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+"""Columnar record storage used by FileStorage in columnar mode
+
+A ColumnTable keeps the raw records of one class as columns instead of
+one dict per object: attributes whose class default is an int or a
+float go to typed arrays, created_at/updated_at are kept as integer
+microseconds, the id is taken from the key, and foreign keys are
+interned so a value shared by many rows is stored once. Rows are
+turned back into record dicts only when they are read.
+"""
+
+import sys
+from array import array
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+DATES = ("created_at", "updated_at")
+_MISSING = object()
+
+
+def _to_micros(value):
+    """Convert an isoformat string to microseconds since the epoch"""
+    return (datetime.fromisoformat(value) - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value):
+    """Convert microseconds since the epoch back to an isoformat string"""
+    return (EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+class ColumnTable(MutableMapping):
+    """Mapping of "<Class>.<id>" keys to records, stored per column"""
+
+    def __init__(self, cls):
+        """Create an empty table for the records of model class cls"""
+        self.cls_name = cls.__name__
+        self.__cls = cls
+        self.__rows = {}
+        self.__free = []
+        self.__size = 0
+        self.__columns = {}
+        self.__present = {}
+
+    def __new_column(self, name, value):
+        """Create the column for name, typed after the class default"""
+        default = getattr(self.__cls, name, None)
+        if name in DATES and isinstance(value, str):
+            column = array('q', bytes(8 * self.__size))
+        elif isinstance(default, bool) or not isinstance(value, (int, float)):
+            column = None
+        elif isinstance(default, int) and isinstance(value, int):
+            column = array('q', bytes(8 * self.__size))
+        elif isinstance(default, float):
+            column = array('d', bytes(8 * self.__size))
+        else:
+            column = None
+        if column is None:
+            self.__columns[name] = [_MISSING] * self.__size
+        else:
+            self.__columns[name] = column
+            self.__present[name] = bytearray(self.__size)
+
+    def __untype(self, name):
+        """Turn a typed column into a plain list after a type mismatch"""
+        column, present = self.__columns[name], self.__present.pop(name)
+        if name in DATES:
+            column = [_from_micros(v) for v in column]
+        self.__columns[name] = [v if present[i] else _MISSING
+                                for i, v in enumerate(column)]
+
+    def __put(self, row, name, value):
+        """Store value in column name at row"""
+        column = self.__columns[name]
+        present = self.__present.get(name)
+        if present is not None and not isinstance(value, bool):
+            try:
+                column[row] = _to_micros(value) if name in DATES else value
+                present[row] = 1
+                return
+            except (TypeError, ValueError, OverflowError):
+                pass
+        if present is not None:
+            self.__untype(name)
+            column = self.__columns[name]
+        if isinstance(value, str) and name.endswith("_id"):
+            value = sys.intern(value)
+        column[row] = value
+
+    def __setitem__(self, key, record):
+        """Store a record dict under key, overwriting its row if known"""
+        row = self.__rows.get(key)
+        if row is None:
+            if self.__free:
+                row = self.__free.pop()
+            else:
+                row = self.__size
+                self.__size += 1
+                for name, column in self.__columns.items():
+                    column.append(0 if name in self.__present else _MISSING)
+                for present in self.__present.values():
+                    present.append(0)
+            self.__rows[key] = row
+        for name in self.__columns:
+            if name not in record:
+                self.__clear(row, name)
+        for name, value in record.items():
+            if name in ("id", "__class__"):
+                continue
+            if name not in self.__columns:
+                self.__new_column(name, value)
+            self.__put(row, name, value)
+
+    def __clear(self, row, name):
+        """Mark column name as absent at row"""
+        if name in self.__present:
+            self.__present[name][row] = 0
+        else:
+            self.__columns[name][row] = _MISSING
+
+    def __getitem__(self, key):
+        """Rebuild the record dict stored under key"""
+        row = self.__rows[key]
+        record = {"id": key.split('.', 1)[1], "__class__": self.cls_name}
+        for name, column in self.__columns.items():
+            present = self.__present.get(name)
+            if present is None:
+                if column[row] is not _MISSING:
+                    record[name] = column[row]
+            elif present[row]:
+                value = column[row]
+                record[name] = _from_micros(value) if name in DATES else value
+        return record
+
+    def __delitem__(self, key):
+        """Forget key, its row is reused by the next new key"""
+        row = self.__rows.pop(key)
+        for name in self.__columns:
+            self.__clear(row, name)
+        self.__free.append(row)
+
+    def __iter__(self):
+        """Iterate over the stored keys"""
+        return iter(self.__rows)
+
+    def __len__(self):
+        """Number of stored records"""
+        return len(self.__rows)
+
+    def __contains__(self, key):
+        """Membership without rebuilding the record"""
+        return key in self.__rows
+
+    def field(self, name):
+        """Yield (key, value) for column name without building records"""
+        column = self.__columns.get(name)
+        if column is None:
+            return
+        present = self.__present.get(name)
+        for key, row in self.__rows.items():
+            if present is None:
+                if column[row] is not _MISSING:
+                    yield key, column[row]
+            elif present[row]:
+                value = column[row]
+                yield key, _from_micros(value) if name in DATES else value
@@ -1,10 +1,26 @@
 #!/usr/bin/python3
-"""DBStorage engine for HBNB clone using MySQL and SQLAlchemy"""
+"""DBStorage engine for HBNB clone using MySQL and SQLAlchemy
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+HBNB_DB_URL selects another database, such as an embedded SQLite file
+(sqlite:///hbnb.db) run in WAL mode with the pragmas of sqlite_pragmas.
+"""
+
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import (create_engine, event, func, insert, inspect, select,
+                        update)
+from sqlalchemy.engine import make_url
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.orm import (joinedload, scoped_session, selectinload,
+                            sessionmaker)
+from sqlalchemy.orm.util import identity_key
 from os import getenv
 from models.base_model import Base
+from models.engine.batch import Batcher, chunked
+from models.engine.metrics import Metrics, timed
+from models.engine.query import OPERATORS, parse_filters, parse_order
 from models.state import State
 from models.city import City
 from models.user import User
@@ -21,6 +37,110 @@ classes = {
     "Amenity": Amenity
 }
 
+# Connection pool settings read from the environment when set
+pool_options = {
+    "pool_size": ("HBNB_DB_POOL_SIZE", int),
+    "max_overflow": ("HBNB_DB_MAX_OVERFLOW", int),
+    "pool_recycle": ("HBNB_DB_POOL_RECYCLE", int),
+    "pool_timeout": ("HBNB_DB_POOL_TIMEOUT", float)
+}
+
+# PRAGMAs run on every new SQLite connection, with their defaults
+sqlite_pragmas = {
+    "journal_mode": ("HBNB_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": ("HBNB_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": ("HBNB_SQLITE_MMAP_SIZE", "268435456"),
+    "busy_timeout": ("HBNB_SQLITE_BUSY_TIMEOUT", "5000")
+}
+
+
+def sqlite_url(url):
+    """Return the SQLite URL, in shared-cache mode if so configured
+
+    With HBNB_SQLITE_SHARED_CACHE set, the database is opened as a
+    "file:" URI with cache=shared; an in-memory database is then one
+    named database seen by every pooled connection.
+    """
+    url = make_url(url)
+    if not getenv("HBNB_SQLITE_SHARED_CACHE"):
+        return url
+    database = url.database
+    query = {"cache": "shared", "uri": "true"}
+    if not database or database == ":memory:":
+        database = "hbnb"
+        query["mode"] = "memory"
+    return url.set(database="file:" + database).update_query_dict(query)
+
+
+def tune_sqlite(engine):
+    """Run the sqlite_pragmas on every connection engine opens
+
+    The driver's own transaction handling is turned off and BEGIN is
+    emitted by the engine instead, without which releasing a SAVEPOINT
+    opened outside a transaction commits it.
+    """
+    @event.listens_for(engine, "connect")
+    def set_pragmas(connection, record):
+        connection.isolation_level = None
+        cursor = connection.cursor()
+        for pragma, (name, default) in sqlite_pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={getenv(name) or default}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+
+def load_options(cls_type, load, strict=True):
+    """Turn load paths such as "cities.places.reviews" into loader options
+
+    Collections are loaded with selectinload (one query per level),
+    single related objects with joinedload. Without strict, paths not
+    starting with a relationship of cls_type are skipped.
+    """
+    if isinstance(load, str):
+        load = [load]
+    options = []
+    for path in load or ():
+        option, owner = None, cls_type
+        for name in path.split("."):
+            relation = owner.__mapper__.relationships.get(name)
+            if relation is None:
+                if option is None and not strict:
+                    break
+                raise AttributeError(
+                    f"{owner.__name__} has no relationship {name}")
+            attr = getattr(owner, name)
+            loader = selectinload if relation.uselist else joinedload
+            option = loader(attr) if option is None else \
+                getattr(option, loader.__name__)(attr)
+            owner = relation.mapper.class_
+        if option is not None:
+            options.append(option)
+    return options
+
+
+def select_query(cls_type, filters, order_by=None, limit=None, offset=0,
+                 load=None):
+    """Build the SELECT for query(), see models.engine.query"""
+    stmt = select(cls_type).options(*load_options(cls_type, load))
+    for attr, op, value in parse_filters(filters):
+        column = getattr(cls_type, attr)
+        if op == "in":
+            stmt = stmt.where(column.in_(value))
+        else:
+            stmt = stmt.where(OPERATORS[op](column, value))
+    for attr, descending in parse_order(order_by):
+        column = getattr(cls_type, attr)
+        stmt = stmt.order_by(column.desc() if descending else column)
+    if offset:
+        stmt = stmt.offset(offset)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
 class DBStorage:
     __engine = None
     __session = None
@@ -32,44 +152,359 @@ class DBStorage:
         db = getenv("HBNB_MYSQL_DB")
         env = getenv("HBNB_ENV")
 
-        if user and pwd and host and db:
-            self.__engine = create_engine(
-                f"mysql+pymysql://{user}:{pwd}@{host}/{db}",
-                pool_pre_ping=True
-            )
+        url = getenv("HBNB_DB_URL")
+        if not url and user and pwd and host and db:
+            url = f"mysql+pymysql://{user}:{pwd}@{host}/{db}"
+
+        if url:
+            options = {}
+            for option, (name, kind) in pool_options.items():
+                if getenv(name):
+                    options[option] = kind(getenv(name))
+            if url.startswith("sqlite"):
+                self.__engine = create_engine(
+                    sqlite_url(url),
+                    connect_args={"check_same_thread": False}, **options
+                )
+                tune_sqlite(self.__engine)
+            else:
+                self.__engine = create_engine(
+                    url, pool_pre_ping=True, **options
+                )
             if env == "test":
                 Base.metadata.drop_all(self.__engine)
 
-    def all(self, cls=None):
+        interval = getenv("HBNB_WRITE_BEHIND")
+        self.__interval = float(interval) if interval else None
+        self.__local = threading.local()
+        self.metrics = Metrics()
+
+    @property
+    def __batcher(self):
+        """The calling thread's Batcher
+
+        Sessions are per thread, so batches and write-behind are too:
+        write-behind commits happen on the thread's next save() once the
+        interval has passed, never on a background thread. Exit flushes
+        run on the main thread, so only its writes are flushed then;
+        other threads' are flushed by their close().
+        """
+        batcher = getattr(self.__local, "batcher", None)
+        if batcher is None:
+            main = threading.current_thread() is threading.main_thread()
+            batcher = Batcher(self.__commit, rollback=self.__rollback,
+                              interval=self.__interval, background=False,
+                              at_exit=main)
+            self.__local.batcher = batcher
+        return batcher
+
+    @timed("all")
+    def all(self, cls=None, load=None):
         obj_dict =  {}
         if self.__session:
             if cls:
                 cls_type = classes.get(cls) if isinstance(cls, str) else cls
                 if cls_type is not None:
-                    for obj in self.__session.query(cls_type).all():
+                    query = self.__session.query(cls_type).options(
+                        *load_options(cls_type, load))
+                    for obj in query.all():
                         obj_dict[f"{type(obj).__name__}.{obj.id}"] = obj
             else:
                 for cl in classes.values():
                     if cl is not None:
-                        for obj in self.__session.query(cl).all():
+                        query = self.__session.query(cl).options(
+                            *load_options(cl, load, strict=False))
+                        for obj in query.all():
                             obj_dict[f"{type(obj).__name__}.{obj.id}"] = obj
         return obj_dict
-    
+
+    def get(self, cls, id, load=None):
+        """Return the object of cls with primary key id, or None"""
+        cls_type = classes.get(cls) if isinstance(cls, str) else cls
+        if not self.__session or cls_type is None:
+            return None
+        return self.__session.get(cls_type, id,
+                                  options=load_options(cls_type, load))
+
+    def count(self, cls=None):
+        """Return the number of rows of cls (or of every class)"""
+        if not self.__session:
+            return 0
+        if cls:
+            cls_type = classes.get(cls) if isinstance(cls, str) else cls
+            types = [cls_type] if cls_type is not None else []
+        else:
+            types = list(classes.values())
+        return sum(self.__session.execute(
+            select(func.count()).select_from(cls_type)).scalar()
+            for cls_type in types)
+
+    def iter_all(self, cls=None, batch_size=1000):
+        """Yield the objects of cls (or of every class) one at a time
+
+        Rows are read in pages of batch_size ordered by id, each page
+        starting after the last id of the previous one, and streamed
+        from the cursor with yield_per so only one page is held.
+        """
+        if not self.__session:
+            return
+        if cls:
+            cls_type = classes.get(cls) if isinstance(cls, str) else cls
+            types = [cls_type] if cls_type is not None else []
+        else:
+            types = list(classes.values())
+        for cls_type in types:
+            last = None
+            while True:
+                query = self.__session.query(cls_type).order_by(cls_type.id)
+                if last is not None:
+                    query = query.filter(cls_type.id > last)
+                count = 0
+                for obj in query.limit(batch_size).yield_per(batch_size):
+                    count += 1
+                    last = obj.id
+                    yield obj
+                if count < batch_size:
+                    break
+
+    def query(self, cls, order_by=None, limit=None, offset=0, load=None,
+              **filters):
+        """Return the objects of cls matching filters, filtered in SQL
+
+        See models.engine.query for the filter syntax.
+        """
+        cls_type = classes.get(cls) if isinstance(cls, str) else cls
+        if not self.__session or cls_type is None:
+            return []
+        return self.__session.scalars(select_query(
+            cls_type, filters, order_by, limit, offset, load)).all()
+
+    @timed("new")
     def new(self, obj):
         if self.__session:
             self.__session.add(obj)
 
+    def bulk_new(self, objs, chunk_size=1000):
+        """Insert many new objects, chunk_size rows per executemany
+
+        Each chunk is saved like save() does, so it is committed right
+        away outside a batch. The objects are not attached to the
+        session; the number inserted is returned.
+        """
+        if not self.__session:
+            return 0
+        count = 0
+        for chunk in chunked(objs, chunk_size):
+            groups = {}
+            for obj in chunk:
+                columns = type(obj).__table__.columns.keys()
+                row = {name: getattr(obj, name) for name in columns
+                       if getattr(obj, name, None) is not None}
+                groups.setdefault(type(obj), []).append(row)
+            for cls_type, group in groups.items():
+                self.__session.execute(insert(cls_type), group)
+            count += len(chunk)
+            self.save()
+        return count
+
+    def bulk_upsert(self, cls, rows, chunk_size=1000):
+        """Insert or update rows of cls from attribute dicts
+
+        Rows whose id is already stored update only the columns they
+        name, with one executemany UPDATE per chunk and per set of
+        columns. The others are inserted with INSERT ... ON DUPLICATE
+        KEY UPDATE on MySQL and ON CONFLICT on SQLite, one multi-row
+        statement per chunk and per set of columns, falling back to
+        merge() elsewhere. Rows without an id get one, keys that are
+        not columns are ignored. Returns the number of rows.
+        """
+        cls_type = classes.get(cls) if isinstance(cls, str) else cls
+        if not self.__session or cls_type is None:
+            return 0
+        table = cls_type.__table__
+        dialect = self.__engine.dialect.name
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert as upsert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            upsert = None
+        now = datetime.utcnow()
+        count = 0
+        for chunk in chunked(rows, chunk_size):
+            ids = [row["id"] for row in chunk if row.get("id")]
+            # Partial rows of stored objects could not pass as INSERTs
+            stored = set(self.__session.scalars(
+                select(table.c.id).where(table.c.id.in_(ids)))) \
+                if ids else set()
+            groups, updates = {}, {}
+            for row in chunk:
+                row = {name: value for name, value in row.items()
+                       if name in table.columns}
+                for name in ("created_at", "updated_at"):
+                    if isinstance(row.get(name), str):
+                        row[name] = datetime.fromisoformat(row[name])
+                row.setdefault("id", str(uuid.uuid4()))
+                row.setdefault("updated_at", now)
+                target = updates if row["id"] in stored else groups
+                target.setdefault(tuple(sorted(row)), []).append(row)
+            for group in updates.values():
+                self.__session.execute(update(cls_type), group)
+            for names, group in groups.items():
+                if upsert is None:
+                    for row in group:
+                        self.__session.merge(cls_type(**row))
+                    continue
+                stmt = upsert(table).values(group)
+                if dialect == "mysql":
+                    stmt = stmt.on_duplicate_key_update(
+                        {name: stmt.inserted[name] for name in names})
+                else:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[table.c.id],
+                        set_={name: stmt.excluded[name] for name in names})
+                self.__session.execute(stmt)
+            # Loaded copies of updated rows are refreshed on next access
+            for group in list(updates.values()) + list(groups.values()):
+                for row in group:
+                    obj = self.__session.identity_map.get(
+                        identity_key(cls_type, row["id"]))
+                    if obj is not None:
+                        self.__session.expire(obj)
+            count += len(chunk)
+            self.save()
+        return count
+
+    @timed("save")
     def save(self):
+        if not self.__batcher.defer():
+            self.__commit()
+
+    @timed("persist")
+    def __commit(self):
+        """Commit the current session"""
         if self.__session:
             self.__session.commit()
 
+    def __rollback(self):
+        """Roll the current session back"""
+        if self.__session:
+            self.__session.rollback()
+
+    def begin(self):
+        """Start coalescing save() calls until the matching commit()"""
+        self.__batcher.begin()
+
+    def commit(self):
+        """End a batch, committing once if anything was saved in it"""
+        self.__batcher.commit()
+
+    def rollback(self):
+        """Abandon the open batch and roll its changes back"""
+        self.__batcher.rollback()
+
+    def batch(self):
+        """Context manager committing once at the end of the block"""
+        return self.__batcher.batch()
+
+    @contextmanager
+    def savepoint(self):
+        """Context manager undoing only the block's changes if it raises
+
+        The block runs in a SAVEPOINT and its changes are flushed at the
+        end, so a constraint it breaks raises there and rolls back to
+        the savepoint; the rest of the open batch is kept.
+        """
+        if not self.__session:
+            yield
+            return
+        nested = self.__session.begin_nested()
+        try:
+            yield
+            self.__session.flush()
+        except BaseException:
+            nested.rollback()
+            raise
+        nested.commit()
+
+    def flush(self):
+        """Commit now any save deferred by a batch or write-behind"""
+        self.__batcher.flush()
+
+    @timed("delete")
     def delete(self, obj=None):
         if self.__session and obj:
             self.__session.delete(obj)
 
+    @timed("reload")
     def reload(self):
         if self.__engine:
             Base.metadata.create_all(self.__engine)
-            session_factory = sessionmaker(bind=self.__engine, expire_on_commit=False)
-            Session = scoped_session(session_factory)
-            self.__session = Session()
+            session_factory = sessionmaker(bind=self.__engine,
+                                           expire_on_commit=False)
+            # The registry hands each thread its own session
+            self.__session = scoped_session(session_factory)
+
+    def upgrade_schema(self, dry_run=False):
+        """Create the indexes the models declare but the database lacks
+
+        Tables that do not exist yet are left to reload(). Returns the
+        CREATE INDEX statements, run unless dry_run is true.
+        """
+        if not self.__engine:
+            return []
+        inspector = inspect(self.__engine)
+        statements = []
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index["name"]
+                        for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing:
+                    continue
+                statements.append(
+                    str(CreateIndex(index).compile(self.__engine)).strip())
+                if not dry_run:
+                    index.create(self.__engine)
+        return statements
+
+    def close(self):
+        """Release the calling thread's session back to the registry
+
+        Writes the thread still owes to write-behind are committed
+        first.
+        """
+        batcher = getattr(self.__local, "batcher", None)
+        if batcher is not None:
+            batcher.close()
+        if self.__session:
+            self.__session.remove()
+
+    def stats(self):
+        """Operation metrics, committed rows per class and database bytes
+
+        Counts are read on a connection of their own, outside the
+        calling thread's session.
+        """
+        stats = {"operations": self.metrics.snapshot(), "objects": {},
+                 "persisted_bytes": None}
+        if not self.__engine:
+            return stats
+        with self.__engine.connect() as conn:
+            tables = inspect(conn)
+            for name, cls_type in classes.items():
+                if tables.has_table(cls_type.__tablename__):
+                    stats["objects"][name] = conn.execute(
+                        select(func.count()).select_from(cls_type)).scalar()
+            dialect = self.__engine.dialect.name
+            if dialect == "sqlite":
+                stats["persisted_bytes"] = \
+                    conn.exec_driver_sql("PRAGMA page_count").scalar() * \
+                    conn.exec_driver_sql("PRAGMA page_size").scalar()
+            elif dialect == "mysql":
+                stats["persisted_bytes"] = int(conn.exec_driver_sql(
+                    "SELECT COALESCE(SUM(data_length + index_length), 0) "
+                    "FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE()").scalar())
+        return stats
@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+"""Advisory inter-process lock used by FileStorage in shared mode"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on this platform, the lock only serializes threads
+    fcntl = None
+
+
+class FileLock:
+    """Re-entrant flock() on a lock file
+
+    Nested hold() calls from the same FileLock reuse the outer lock, so
+    the mode of the outermost hold wins. Separate FileLock instances use
+    separate descriptors and therefore block each other, even within a
+    single process.
+    """
+
+    def __init__(self, path):
+        """Remember the lock file path, it is created on first use"""
+        self.path = path
+        self.__fd = None
+        self.__depth = 0
+        self.__mutex = threading.RLock()
+
+    @contextmanager
+    def hold(self, exclusive=True):
+        """Hold the lock, shared or exclusive, for the with block"""
+        with self.__mutex:
+            if not self.__depth:
+                self.__fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl:
+                    fcntl.flock(self.__fd,
+                                fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self.__depth += 1
+            try:
+                yield
+            finally:
+                self.__depth -= 1
+                if not self.__depth:
+                    if fcntl:
+                        fcntl.flock(self.__fd, fcntl.LOCK_UN)
+                    os.close(self.__fd)
+                    self.__fd = None
@@ -2,7 +2,22 @@
 """This module defines a class to manage file storage for hbnb clone"""
 
 import json
-from os.path import exists
+import os
+import threading
+import uuid
+import weakref
+import zlib
+from contextlib import nullcontext
+from datetime import datetime
+from os import getenv
+from os.path import exists, getsize
+from types import MappingProxyType
+from models.engine import binary_snapshot
+from models.engine.batch import Batcher
+from models.engine.column_store import ColumnTable
+from models.engine.file_lock import FileLock
+from models.engine.metrics import Metrics, timed
+from models.engine.query import matches, parse_filters, sort_objects
 from models.base_model import BaseModel
 from models.user import User
 from models.place import Place
@@ -12,11 +27,70 @@ from models.amenity import Amenity
 from models.review import Review
 
 
+def _flag(name):
+    """Return True if the environment variable name is switched on"""
+    return getenv(name, "").lower() in ("1", "true", "yes")
+
+
 class FileStorage:
-    """This class manages storage of hbnb models in JSON format"""
+    """This class manages storage of hbnb models in JSON format
+
+    When HBNB_FILE_JOURNAL is set, save() appends only the objects
+    added, updated or deleted since the last save to a journal next to
+    the snapshot file. reload() replays the journal on top of the
+    snapshot, and the journal is folded back into the snapshot in the
+    background once it grows past HBNB_JOURNAL_COMPACT_BYTES.
+
+    When HBNB_FILE_LAZY is set, reload() only keeps the raw records and
+    a model instance is built the first time it is reached through
+    all(), get() or lookup().
+
+    With HBNB_FILE_FORMAT=binary the snapshot is kept in file.bin using
+    the memory-mapped format of models.engine.binary_snapshot, so lazy
+    records are decoded straight from the map when they are needed.
+
+    Inside a batch() block (or between begin() and commit()) save()
+    only marks the storage dirty and the data is persisted once when the
+    block ends. HBNB_WRITE_BEHIND=<seconds> defers every save to a
+    background thread that persists at most once per interval.
+
+    With HBNB_FILE_SHARED set, several processes can use the same files:
+    saves hold an advisory lock on file.json.lock and first merge what
+    other processes saved, and every process notices foreign changes
+    from the size, mtime and inode of the snapshot and journal. When
+    only the journal grew, just its new tail is applied; otherwise the
+    files are re-read but unchanged records are left alone.
+
+    With HBNB_FILE_LAYOUT=sharded the snapshot is split into one file
+    per class in file.shards/, or HBNB_FILE_SHARDS hash buckets per
+    class. save() then rewrites only the shards holding objects passed
+    to new() or delete() since the last save, and reload(classes) reads
+    only the named classes; the others are read on first access.
+
+    HBNB_FILE_COLUMNAR keeps unbuilt records in per-class columns
+    (models.engine.column_store) instead of one dict per object, and
+    implies lazy mode. After each save the built objects are folded back
+    into the columns; they stay usable as proxies while referenced, but
+    changes to them are only kept once they go through new() again.
+
+    Objects are also bucketed per class so all(cls) only touches the
+    objects of that class, and the foreign keys listed in fk_indexes
+    are reverse indexed so the file-mode relationship properties cost
+    O(result) through lookup().
+
+    Calls are counted and timed in metrics (models.engine.metrics) and
+    reported by stats().
+    """
 
     __file_path = "file.json"
     __objects = {}
+    __by_class = {}
+    __pending = {}
+    __fk = {}
+    __loaded = set()
+    __proxies = weakref.WeakValueDictionary()
+    __dirty = set()
+    __deleted = set()
 
     classes = {
         'BaseModel': BaseModel,
@@ -28,47 +102,930 @@ class FileStorage:
         'Review': Review
     }
 
-    def all(self, cls=None):
+    fk_indexes = {
+        'City': ('state_id',),
+        'Place': ('city_id', 'user_id', 'amenity_ids'),
+        'Review': ('place_id', 'user_id')
+    }
+
+    def __init__(self):
+        """Read storage options from the environment"""
+        self.__journal = _flag("HBNB_FILE_JOURNAL")
+        self.__columnar = _flag("HBNB_FILE_COLUMNAR")
+        self.__lazy = _flag("HBNB_FILE_LAZY") or self.__columnar
+        self.__binary = getenv("HBNB_FILE_FORMAT", "json") == "binary"
+        self.__sharded = getenv("HBNB_FILE_LAYOUT", "single") == "sharded"
+        self.__shards = int(getenv("HBNB_FILE_SHARDS", 1))
+        self.__compact_bytes = int(getenv("HBNB_JOURNAL_COMPACT_BYTES",
+                                          4 * 1024 * 1024))
+        self.__shared = _flag("HBNB_FILE_SHARED")
+        self.__lock = FileLock(self.__file_path + ".lock")
+        self.__seen = None
+        self.__journal_lock = threading.Lock()
+        self.__compactor = None
+        interval = getenv("HBNB_WRITE_BEHIND")
+        self.__batcher = Batcher(self.__persist,
+                                 interval=float(interval) if interval else None)
+        self.metrics = Metrics()
+        # One bound method shared by every stored object
+        self.__changed = self.changed
+
+    @property
+    def snapshot_path(self):
+        """Path of the snapshot (directory of shards when sharded)"""
+        if self.__sharded:
+            return os.path.splitext(self.__file_path)[0] + ".shards"
+        if self.__binary:
+            return os.path.splitext(self.__file_path)[0] + ".bin"
+        return self.__file_path
+
+    @property
+    def journal_path(self):
+        """Path of the append-only journal kept next to the snapshot"""
+        return self.__file_path + ".log"
+
+    @timed("all")
+    def all(self, cls=None, load=None):
         """
         Returns a dictionary of models currently in storage
-        If cls is provided, return only objects of that class.
+        If cls is provided, return a read-only view of the objects of
+        that class. load is accepted for parity with DBStorage:
+        relationships are answered from the fk indexes on access.
         """
+        self.refresh()
         if cls is None:
+            self.__ensure_loaded()
+            for cls_name in list(self.__pending):
+                self.__hydrate_class(cls_name)
             return self.__objects
-        # Filter objects by class
-        cls_name = cls.__name__ if isinstance(cls, type) else cls.__name__
-        filtered_objects = {k: v for k, v in self.__objects.items() if type(v).__name__ == cls_name}
-        return filtered_objects
-    
+        cls_name = cls if isinstance(cls, str) else cls.__name__
+        self.__ensure_loaded(cls_name)
+        self.__check_buckets()
+        self.__hydrate_class(cls_name)
+        return MappingProxyType(self.__by_class.setdefault(cls_name, {}))
+
+    def iter_all(self, cls=None, batch_size=None):
+        """Yield the objects of cls (or of every class) one at a time
+
+        Unbuilt records are built as they are reached instead of all up
+        front. batch_size is accepted for parity with DBStorage.
+        """
+        cls_name = None
+        if cls is not None:
+            cls_name = cls if isinstance(cls, str) else cls.__name__
+        self.refresh()
+        self.__ensure_loaded(cls_name)
+        self.__check_buckets()
+        if cls_name:
+            names = [cls_name]
+        else:
+            names = list(dict.fromkeys(list(self.__by_class) +
+                                       list(self.__pending)))
+        for name in names:
+            keys = list(self.__by_class.get(name, ())) + \
+                list(self.__pending.get(name, ()))
+            for key in keys:
+                obj = self.__get_key(name, key)
+                if obj is not None:
+                    yield obj
+
+    def get(self, cls, id, load=None):
+        """Return the object of cls with the given id, or None"""
+        cls_name = cls if isinstance(cls, str) else cls.__name__
+        self.refresh()
+        self.__ensure_loaded(cls_name)
+        return self.__get_key(cls_name, f"{cls_name}.{id}")
+
+    def count(self, cls=None):
+        """Return the number of objects of cls (or of every class)
+
+        Built and unbuilt objects are counted without building any.
+        """
+        cls_name = None
+        if cls is not None:
+            cls_name = cls if isinstance(cls, str) else cls.__name__
+        self.refresh()
+        self.__ensure_loaded(cls_name)
+        self.__check_buckets()
+        if cls_name:
+            return len(self.__by_class.get(cls_name, ())) + \
+                len(self.__pending.get(cls_name, ()))
+        return len(self.__objects) + sum(map(len, self.__pending.values()))
+
+    def __ensure_loaded(self, cls_name=None):
+        """Read the shards of cls_name (or every class) if not loaded yet"""
+        if not self.__sharded:
+            return
+        names = [cls_name] if cls_name else list(self.classes)
+        missing = [name for name in names
+                   if name in self.classes and name not in self.__loaded]
+        if missing:
+            self.__load(missing, replace=False)
+
+    def __get_key(self, cls_name, key):
+        """Return the object stored under key, building it if pending"""
+        obj = self.__objects.get(key)
+        if obj is not None:
+            return obj
+        pending = self.__pending.get(cls_name, {})
+        if key not in pending:
+            return None
+        obj = self.__proxies.pop(key, None)
+        if obj is None:
+            return self.__build(cls_name, key, pending.pop(key))
+        del pending[key]
+        self.__store(key, obj)
+        return obj
+
+    def __hydrate_class(self, cls_name):
+        """Build every pending object of cls_name"""
+        pending = self.__pending.pop(cls_name, None)
+        for key in list(pending or ()):
+            obj = self.__proxies.pop(key, None)
+            if obj is None:
+                self.__build(cls_name, key, pending[key])
+            else:
+                self.__store(key, obj)
+
+    def __pending_table(self, cls_name):
+        """Return the container of unbuilt records of cls_name"""
+        pending = self.__pending.get(cls_name)
+        if pending is None:
+            if self.__columnar:
+                pending = ColumnTable(self.classes[cls_name])
+            else:
+                pending = {}
+            self.__pending[cls_name] = pending
+        return pending
+
+    def __release(self):
+        """Fold built objects back into the columns, keeping weak proxies"""
+        for key, obj in list(self.__objects.items()):
+            cls_name = type(obj).__name__
+            if cls_name not in self.classes:
+                continue
+            record = obj.to_dict()
+            self.__discard(key)
+            self.__pending_table(cls_name)[key] = record
+            self.__index_record(cls_name, key, record)
+            self.__proxies[key] = obj
+
+    @staticmethod
+    def __decode(record):
+        """Return a pending record as a dict, reading it from its snapshot"""
+        if isinstance(record, dict):
+            return record
+        snapshot, offset, length = record
+        return snapshot.record(offset, length)
+
+    def __build(self, cls_name, key, record):
+        """Instantiate a raw record and store it"""
+        obj = self.classes[cls_name](**self.__decode(record))
+        self.__store(key, obj)
+        return obj
+
+    def __check_buckets(self):
+        """Rebuild the class buckets if __objects was changed directly"""
+        if sum(map(len, self.__by_class.values())) == len(self.__objects):
+            return
+        # Clear in place so views handed out by all(cls) stay live
+        for bucket in self.__by_class.values():
+            bucket.clear()
+        self.__fk.clear()
+        for key, obj in self.__objects.items():
+            self.__by_class.setdefault(type(obj).__name__, {})[key] = obj
+
+    def __store(self, key, obj):
+        """Put obj in __objects, its class bucket and the fk indexes"""
+        previous = self.__objects.get(key)
+        if previous is not None and previous is not obj:
+            self.__unindex_fk(key, previous)
+        self.__objects[key] = obj
+        self.__by_class.setdefault(type(obj).__name__, {})[key] = obj
+        self.__index_fk(key, obj)
+        # Attribute sets on obj now reach changed()
+        obj.__dict__["_storage_changed"] = self.__changed
+
+    def __discard(self, key):
+        """Remove the object stored under key from every structure"""
+        obj = self.__objects.pop(key, None)
+        if obj is not None:
+            self.__by_class.get(type(obj).__name__, {}).pop(key, None)
+            self.__unindex_fk(key, obj)
+        return obj
+
+    @staticmethod
+    def __fk_values(value):
+        """Values an fk attribute is indexed under, lists are exploded"""
+        if isinstance(value, (list, tuple, set)):
+            return value
+        return (value,) if value else ()
+
+    def __fk_index(self, cls_name, attr):
+        """Return the index of attr for cls_name, building it on first use"""
+        index = self.__fk.get((cls_name, attr))
+        if index is not None:
+            return index
+        index = self.__fk[(cls_name, attr)] = {}
+        for key, obj in self.__by_class.get(cls_name, {}).items():
+            for value in self.__fk_values(getattr(obj, attr, None)):
+                index.setdefault(value, {})[key] = None
+        pending = self.__pending.get(cls_name, {})
+        if isinstance(pending, ColumnTable):
+            fields = pending.field(attr)
+        else:
+            fields = ((key, self.__decode(record).get(attr))
+                      for key, record in pending.items())
+        for key, value in fields:
+            for value in self.__fk_values(value):
+                index.setdefault(value, {})[key] = None
+        return index
+
+    def __index_record(self, cls_name, key, raw, add=True):
+        """Add (or remove) a pending record in the built fk indexes"""
+        record = None
+        for attr in self.fk_indexes.get(cls_name, ()):
+            index = self.__fk.get((cls_name, attr))
+            if index is None:
+                continue
+            if record is None:
+                record = self.__decode(raw)
+            for value in self.__fk_values(record.get(attr)):
+                if add:
+                    index.setdefault(value, {})[key] = None
+                elif key in index.get(value, {}):
+                    del index[value][key]
+                    if not index[value]:
+                        del index[value]
+
+    def __index_fk(self, key, obj, attrs=None):
+        """Add obj under the current values of its built indexes"""
+        cls_name = type(obj).__name__
+        for attr in attrs or self.fk_indexes.get(cls_name, ()):
+            index = self.__fk.get((cls_name, attr))
+            if index is None:
+                continue
+            for value in self.__fk_values(getattr(obj, attr, None)):
+                index.setdefault(value, {})[key] = None
+
+    def __unindex_fk(self, key, obj, attrs=None, values=None):
+        """Remove obj from the built fk indexes it is filed under"""
+        cls_name = type(obj).__name__
+        for attr in attrs or self.fk_indexes.get(cls_name, ()):
+            index = self.__fk.get((cls_name, attr))
+            if index is None:
+                continue
+            old = values if values is not None else getattr(obj, attr, None)
+            for value in self.__fk_values(old):
+                bucket = index.get(value)
+                if bucket is not None:
+                    bucket.pop(key, None)
+                    if not bucket:
+                        del index[value]
+
+    def changed(self, obj, attr, old):
+        """Track a stored obj whose attr was just set (old was its value)
+
+        The object is marked dirty so journal and sharded saves write it
+        and moved in the index of attr. A columnar proxy comes back from
+        its columns first, so its change is the value saved next.
+        Changes made in place, such as appending to a list attribute,
+        are not seen: assign a new value or pass the object to new().
+        """
+        cls_name = type(obj).__name__
+        key = f"{cls_name}.{getattr(obj, 'id', None)}"
+        if self.__objects.get(key) is not obj:
+            if self.__proxies.get(key) is not obj or \
+                    key not in self.__pending.get(cls_name, ()):
+                return
+            self.__get_key(cls_name, key)
+        self.__dirty.add(key)
+        if (cls_name, attr) in self.__fk:
+            self.__unindex_fk(key, obj, (attr,),
+                              old if old is not None else ())
+            self.__index_fk(key, obj, (attr,))
+
+    def lookup(self, cls, attr, value):
+        """Return the objects of cls whose indexed attr holds value"""
+        cls_name = cls if isinstance(cls, str) else cls.__name__
+        if attr not in self.fk_indexes.get(cls_name, ()):
+            return [obj for obj in self.all(cls_name).values()
+                    if getattr(obj, attr, None) == value]
+        self.__ensure_loaded(cls_name)
+        self.__check_buckets()
+        keys = list(self.__fk_index(cls_name, attr).get(value, ()))
+        return [self.__get_key(cls_name, key) for key in keys]
+
+    def query(self, cls, order_by=None, limit=None, offset=0, load=None,
+              **filters):
+        """Return the objects of cls matching filters, as a list
+
+        See models.engine.query for the filter syntax. Equality and in
+        filters on indexed foreign keys are answered from the reverse
+        indexes, columnar records are filtered one column at a time, and
+        only the matching objects are built. load is ignored, as in all().
+        """
+        cls_name = cls if isinstance(cls, str) else cls.__name__
+        cls_type = self.classes.get(cls_name)
+        if cls_type is None:
+            return []
+        self.refresh()
+        self.__ensure_loaded(cls_name)
+        self.__check_buckets()
+        keys = None
+        conditions = []
+        for attr, op, value in parse_filters(filters):
+            if op in ("eq", "in") and \
+                    attr in self.fk_indexes.get(cls_name, ()) and \
+                    not isinstance(getattr(cls_type, attr, None), list):
+                index = self.__fk_index(cls_name, attr)
+                found = set()
+                for one in ([value] if op == "eq" else value):
+                    found.update(index.get(one, ()))
+                keys = found if keys is None else keys & found
+            else:
+                conditions.append((attr, op, value))
+        built = self.__by_class.get(cls_name, {})
+        result = [obj for key, obj in list(built.items())
+                  if (keys is None or key in keys) and
+                  all(matches(getattr(obj, attr, None), op, value)
+                      for attr, op, value in conditions)]
+        for key in self.__pending_matches(cls_type, keys, conditions):
+            obj = self.__get_key(cls_name, key)
+            if obj is not None:
+                result.append(obj)
+        sort_objects(result, order_by)
+        if limit is None:
+            return result[offset:]
+        return result[offset:offset + limit]
+
+    @staticmethod
+    def __field_value(attr, value):
+        """Value of attr as a built object would hold it"""
+        if attr in ("created_at", "updated_at") and isinstance(value, str):
+            return datetime.fromisoformat(value)
+        return value
+
+    def __pending_matches(self, cls_type, keys, conditions):
+        """Keys of the unbuilt records of cls_type matching conditions"""
+        pending = self.__pending.get(cls_type.__name__)
+        if not pending:
+            return []
+        if keys is None:
+            candidates = set(pending)
+        else:
+            candidates = {key for key in keys if key in pending}
+        if isinstance(pending, ColumnTable):
+            for attr, op, value in conditions:
+                default = getattr(cls_type, attr, None)
+                seen, matched = set(), set()
+                for key, field in pending.field(attr):
+                    seen.add(key)
+                    field = self.__field_value(attr, field)
+                    if key in candidates and matches(field, op, value):
+                        matched.add(key)
+                if matches(default, op, value):
+                    matched.update(candidates - seen)
+                candidates = matched
+            return list(candidates)
+        found = []
+        for key in candidates:
+            record = self.__decode(pending[key])
+            for attr, op, value in conditions:
+                field = record.get(attr, getattr(cls_type, attr, None))
+                if not matches(self.__field_value(attr, field), op, value):
+                    break
+            else:
+                found.append(key)
+        return found
+
+    @timed("new")
     def new(self, obj):
         """Adds new object to storage dictionary"""
-        key = f"{type(obj).__name__}.{obj.id}"
-        self.__objects[key] = obj
+        cls_name = type(obj).__name__
+        key = f"{cls_name}.{obj.id}"
+        if key in self.__pending.get(cls_name, ()):
+            # Build the stale record so its index entries get replaced
+            self.__get_key(cls_name, key)
+        self.__store(key, obj)
+        self.__dirty.add(key)
+        self.__deleted.discard(key)
 
+    def bulk_new(self, objs):
+        """Add many objects and persist them with a single save()"""
+        count = 0
+        for obj in objs:
+            cls_name = type(obj).__name__
+            key = f"{cls_name}.{obj.id}"
+            if key in self.__pending.get(cls_name, ()):
+                self.__get_key(cls_name, key)
+            self.__store(key, obj)
+            self.__dirty.add(key)
+            self.__deleted.discard(key)
+            count += 1
+        self.save()
+        return count
+
+    def bulk_upsert(self, cls, rows):
+        """Insert or update objects of cls from attribute dicts
+
+        A row whose id is stored updates that object, other rows are
+        added (with a new id if they have none). Unbuilt records are
+        updated in place without being built. Everything is persisted
+        with a single save(); the number of rows is returned.
+        """
+        cls_name = cls if isinstance(cls, str) else cls.__name__
+        if cls_name not in self.classes:
+            return 0
+        self.refresh()
+        self.__ensure_loaded(cls_name)
+        self.__check_buckets()
+        now = datetime.utcnow().isoformat()
+        count = 0
+        for row in rows:
+            row = dict(row)
+            row.pop("__class__", None)
+            for name in ("created_at", "updated_at"):
+                if isinstance(row.get(name), datetime):
+                    row[name] = row[name].isoformat()
+            row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("updated_at", now)
+            key = f"{cls_name}.{row['id']}"
+            if key in self.__objects or key in self.__proxies:
+                obj = self.__get_key(cls_name, key)
+                for name, value in row.items():
+                    if name in ("created_at", "updated_at"):
+                        value = datetime.fromisoformat(value)
+                    setattr(obj, name, value)
+            else:
+                record = {"__class__": cls_name, "created_at": now}
+                pending = self.__pending_table(cls_name)
+                if key in pending:
+                    old = pending.pop(key)
+                    self.__index_record(cls_name, key, old, add=False)
+                    record = self.__decode(old)
+                record = dict(record, **row)
+                pending[key] = record
+                self.__index_record(cls_name, key, record)
+                if not self.__lazy:
+                    self.__get_key(cls_name, key)
+            self.__dirty.add(key)
+            self.__deleted.discard(key)
+            count += 1
+        self.save()
+        return count
+
+    def __records(self, classes=None):
+        """Return the serialized form of the stored objects of classes
+
+        Pending binary records are copied as encoded bytes when writing a
+        binary snapshot and decoded otherwise.
+        """
+        records = {}
+        if classes is not None:
+            self.__check_buckets()
+            objects = [(key, obj) for name in classes
+                       for key, obj in list(self.__by_class.get(name, {}).items())]
+        else:
+            # Copies keep a write-behind flush safe from concurrent new()
+            objects = list(self.__objects.items())
+        for name, pending in list(self.__pending.items()):
+            if classes is not None and name not in classes:
+                continue
+            for key, record in list(pending.items()):
+                if isinstance(record, dict):
+                    records[key] = record
+                elif self.__binary:
+                    records[key] = record[0].raw(record[1], record[2])
+                else:
+                    records[key] = self.__decode(record)
+        for key, obj in objects:
+            records[key] = obj.to_dict()
+        return records
+
+    @timed("save")
     def save(self):
         """Save storage dictionary to a file"""
-        with open(self.__file_path, 'w') as f:
-            json.dump({k: v.to_dict() for k, v in self.__objects.items()}, f, indent=4)
+        if self.__batcher.defer():
+            return
+        self.__persist()
+
+    def begin(self):
+        """Start coalescing save() calls until the matching commit()"""
+        self.__batcher.begin()
+
+    def commit(self):
+        """End a batch, persisting once if anything was saved in it"""
+        self.__batcher.commit()
+
+    def batch(self):
+        """Context manager persisting once at the end of the block"""
+        return self.__batcher.batch()
+
+    def flush(self):
+        """Persist now any save deferred by a batch or write-behind"""
+        self.__batcher.flush()
+
+    def __hold(self, exclusive=True):
+        """Inter-process lock in shared mode, a no-op otherwise"""
+        if self.__shared:
+            return self.__lock.hold(exclusive)
+        return nullcontext()
+
+    def __signatures(self):
+        """Identify the snapshot and journal currently on disk"""
+        signatures = []
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                st = os.stat(path)
+                signatures.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signatures.append(None)
+        return tuple(signatures)
+
+    def refresh(self):
+        """Pick up what other processes saved since this one last looked"""
+        if not self.__shared:
+            return
+        with self.__lock.hold(exclusive=False):
+            self.__refresh()
+
+    def __refresh(self):
+        """Merge foreign changes, the caller holds the lock"""
+        current = self.__signatures()
+        if current == self.__seen:
+            return
+        snapshot, journal = current
+        seen_snapshot, seen_journal = self.__seen or (None, None)
+        if snapshot == seen_snapshot and journal and seen_journal and \
+                journal[0] == seen_journal[0] and journal[2] > seen_journal[2]:
+            # Only appended to: apply the tail written since last time
+            with open(self.journal_path, 'rb') as f:
+                f.seek(seen_journal[2])
+                tail = f.read()
+            for line in tail.splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.__merge(entry["key"], entry.get("value"))
+        else:
+            loaded = list(self.__loaded) if self.__sharded else None
+            records = self.__read_state(loaded) or {}
+            local = list(self.__objects)
+            for pending in self.__pending.values():
+                local.extend(pending)
+            for key in local:
+                if key not in records:
+                    self.__merge(key, None)
+            for key, record in records.items():
+                self.__merge(key, record)
+        self.__seen = current
+
+    def __merge(self, key, record):
+        """Adopt another process's version of key unless changed here
+
+        A record of None means the key was deleted elsewhere. Objects
+        whose updated_at did not change are left untouched.
+        """
+        if key in self.__dirty or key in self.__deleted:
+            return
+        cls_name = key.split('.', 1)[0]
+        if cls_name not in self.classes:
+            return
+        if self.__sharded and cls_name not in self.__loaded:
+            # Read in full on first access
+            return
+        pending = self.__pending_table(cls_name)
+        obj = self.__objects.get(key)
+        if obj is not None:
+            current = obj.updated_at.isoformat()
+        elif key in pending:
+            current = self.__decode(pending[key]).get("updated_at")
+        else:
+            current = None
+        if record is not None and current is not None and \
+                current == self.__decode(record).get("updated_at"):
+            return
+        self.__proxies.pop(key, None)
+        if obj is not None:
+            self.__discard(key)
+        elif key in pending:
+            self.__index_record(cls_name, key, pending.pop(key), add=False)
+        if record is None:
+            return
+        if self.__columnar:
+            record = self.__decode(record)
+        pending[key] = record
+        self.__index_record(cls_name, key, record)
+        if not self.__lazy:
+            self.__get_key(cls_name, key)
+
+    @timed("persist")
+    def __persist(self):
+        """Write pending changes in the configured layout"""
+        with self.__hold():
+            if self.__shared:
+                self.__refresh()
+            journals = (self.journal_path, self.journal_path + ".old")
+            if self.__journal:
+                self.__append_journal()
+            elif self.__sharded and not any(map(exists, journals)):
+                self.__write_dirty_shards()
+            else:
+                self.__ensure_loaded()
+                self.__write_snapshot(self.__records())
+                self.__dirty.clear()
+                self.__deleted.clear()
+                # A full snapshot supersedes any journal left behind
+                for path in journals:
+                    if exists(path):
+                        os.remove(path)
+            if self.__shared:
+                self.__seen = self.__signatures()
+            if self.__columnar:
+                self.__release()
+
+    def __append_journal(self):
+        """Append the records changed since the last save to the journal"""
+        with self.__journal_lock:
+            dirty, deleted = set(self.__dirty), set(self.__deleted)
+            self.__dirty.difference_update(dirty)
+            self.__deleted.difference_update(deleted)
+            lines = [json.dumps({"op": "delete", "key": key})
+                     for key in deleted]
+            for key in dirty:
+                obj = self.__objects.get(key)
+                pending = self.__pending.get(key.split('.', 1)[0], {})
+                if obj is not None:
+                    value = obj.to_dict()
+                elif key in pending:
+                    # Updated in place by bulk_upsert()
+                    value = self.__decode(pending[key])
+                else:
+                    continue
+                lines.append(json.dumps({"op": "put", "key": key,
+                                         "value": value}))
+            if not lines:
+                return
+            with open(self.journal_path, 'a') as f:
+                f.write("\n".join(lines) + "\n")
+            size = getsize(self.journal_path)
+        if size >= self.__compact_bytes:
+            self.compact(wait=False)
+
+    def compact(self, wait=True):
+        """Fold the journal into a fresh snapshot
+
+        The journal is rotated aside and the current objects captured
+        while holding the journal lock; writing the snapshot happens on a
+        background thread unless wait is true. In shared mode the whole
+        compaction runs under the inter-process lock instead, so other
+        processes never see the snapshot and journals out of step.
+        """
+        if self.__shared:
+            with self.__lock.hold():
+                self.__refresh()
+                self.__compact(wait=True)
+                self.__seen = self.__signatures()
+            return
+        self.__compact(wait)
+
+    def __compact(self, wait):
+        """Rotate the journal and write the snapshot"""
+        with self.__journal_lock:
+            if self.__compactor and self.__compactor.is_alive():
+                if not wait:
+                    return
+                self.__compactor.join()
+            old = self.journal_path + ".old"
+            if exists(self.journal_path):
+                if exists(old):
+                    # A previous compaction did not finish, keep its ops
+                    with open(self.journal_path) as src, open(old, 'a') as dst:
+                        dst.write(src.read())
+                    os.remove(self.journal_path)
+                else:
+                    os.replace(self.journal_path, old)
+            self.__ensure_loaded()
+            records = self.__records()
+            self.__compactor = threading.Thread(
+                target=self.__fold_journal, args=(records, old), daemon=True)
+            self.__compactor.start()
+        if wait:
+            self.__compactor.join()
+
+    def __shard_of(self, key):
+        """Name of the shard holding key: its class and hash bucket"""
+        cls_name = key.split('.', 1)[0]
+        if self.__shards > 1:
+            return f"{cls_name}.{zlib.crc32(key.encode()) % self.__shards}"
+        return cls_name
+
+    def __write_dirty_shards(self):
+        """Rewrite only the shards touched since the last save"""
+        dirty, deleted = set(self.__dirty), set(self.__deleted)
+        shards = {self.__shard_of(key) for key in dirty | deleted}
+        classes = {shard.split('.', 1)[0] for shard in shards}
+        for cls_name in classes:
+            self.__ensure_loaded(cls_name)
+        records = {key: record
+                   for key, record in self.__records(classes).items()
+                   if self.__shard_of(key) in shards}
+        self.__write_shards(records, shards)
+        self.__dirty.difference_update(dirty)
+        self.__deleted.difference_update(deleted)
+
+    def __write_shards(self, records, shards=None):
+        """Write records grouped per shard, removing emptied shards
+
+        Only the shards named in shards are touched, every shard when it
+        is None.
+        """
+        directory = self.snapshot_path
+        os.makedirs(directory, exist_ok=True)
+        ext = ".bin" if self.__binary else ".json"
+        groups = {}
+        for key, record in records.items():
+            groups.setdefault(self.__shard_of(key), {})[key] = record
+        if shards is None:
+            shards = set(groups)
+            shards.update(os.path.splitext(name)[0]
+                          for name in os.listdir(directory)
+                          if name.endswith(ext))
+        for shard in shards:
+            path = os.path.join(directory, shard + ext)
+            if shard not in groups:
+                if exists(path):
+                    os.remove(path)
+            elif self.__binary:
+                binary_snapshot.write(path, groups[shard])
+            else:
+                with open(path + ".tmp", 'w') as f:
+                    json.dump(groups[shard], f)
+                os.replace(path + ".tmp", path)
+
+    def __write_snapshot(self, records):
+        """Atomically replace the snapshot in the configured format"""
+        if self.__sharded:
+            self.__write_shards(records)
+            return
+        if self.__binary:
+            binary_snapshot.write(self.snapshot_path, records)
+            return
+        tmp = self.__file_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(records, f, indent=4)
+        os.replace(tmp, self.__file_path)
+
+    def __fold_journal(self, records, old_journal):
+        """Write the compacted snapshot, then drop the folded journal"""
+        self.__write_snapshot(records)
+        if exists(old_journal):
+            os.remove(old_journal)
+
+    def __replay_journal(self, path, records):
+        """Apply the operations recorded in a journal file to records"""
+        if not exists(path):
+            return
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn trailing write from an interrupted save
+                    continue
+                if entry.get("op") == "put":
+                    records[entry["key"]] = entry["value"]
+                elif entry.get("op") == "delete":
+                    records.pop(entry["key"], None)
 
-    def reload(self):
-        """Loads storage dictionary from file"""
-        if not exists(self.__file_path):
+    def __read_file(self, path, temp):
+        """Add the records of one snapshot file to temp"""
+        if not getsize(path):
             return
+        if self.__binary:
+            mapped = binary_snapshot.BinarySnapshot(path)
+            for entries in mapped.index.values():
+                for key, (offset, length) in entries.items():
+                    temp[key] = (mapped, offset, length)
+        else:
+            with open(path, 'r') as f:
+                temp.update(json.load(f))
+
+    def __read_state(self, classes=None):
+        """Return snapshot plus journals as raw records, None if absent
+
+        With the sharded layout only the shards of classes are read when
+        classes is given.
+        """
+        snapshot = self.snapshot_path
+        journals = (self.journal_path + ".old", self.journal_path)
+        if not exists(snapshot) and not any(map(exists, journals)):
+            return None
+        temp = {}
+        if self.__sharded and os.path.isdir(snapshot):
+            ext = ".bin" if self.__binary else ".json"
+            for name in sorted(os.listdir(snapshot)):
+                if not name.endswith(ext):
+                    continue
+                if classes is None or name.split('.', 1)[0] in classes:
+                    self.__read_file(os.path.join(snapshot, name), temp)
+        elif exists(snapshot):
+            self.__read_file(snapshot, temp)
+        for path in journals:
+            self.__replay_journal(path, temp)
+        if classes is not None:
+            temp = {key: val for key, val in temp.items()
+                    if key.split('.', 1)[0] in classes}
+        return temp
+
+    @timed("reload")
+    def reload(self, classes=None):
+        """Loads storage dictionary from file
+
+        With the sharded layout, classes limits the load to those class
+        names; the other classes are read the first time they are used.
+        """
+        if not self.__sharded:
+            classes = None
+        self.__load(classes, replace=True)
+
+    def __load(self, classes, replace):
+        """Read the records of classes (all when None) into pending
+
+        When replace is false, objects with unsaved changes are kept.
+        """
+        names = list(self.classes) if classes is None else list(classes)
         try:
-            with open(self.__file_path, 'r') as f:
-                temp = json.load(f)
+            with self.__hold(exclusive=False):
+                temp = self.__read_state(classes)
+                if classes is None:
+                    self.__seen = self.__signatures()
+            self.__loaded.update(names)
+            if temp is None:
+                return
+            # Indexes are rebuilt on their next lookup
+            self.__fk.clear()
             for key, val in temp.items():
-                cls_name = val["__class__"]
-                cls = self.classes.get(cls_name)
-                if cls:
-                    self.__objects[key] = cls(**val)
+                cls_name = key.split('.', 1)[0]
+                if cls_name not in self.classes:
+                    continue
+                if not replace and (key in self.__objects or
+                                    key in self.__deleted):
+                    continue
+                self.__discard(key)
+                self.__proxies.pop(key, None)
+                if self.__columnar:
+                    val = self.__decode(val)
+                self.__pending_table(cls_name)[key] = val
+            if not self.__lazy:
+                for cls_name in names:
+                    self.__hydrate_class(cls_name)
+            if replace:
+                for keys in (self.__dirty, self.__deleted):
+                    keys.difference_update([key for key in keys
+                                            if key.split('.', 1)[0] in names])
         except Exception:
             # Handles empty or invalid json
             pass
 
+    @timed("delete")
     def delete(self, obj=None):
         """Delete obj from __objects if it's inside"""
         if obj:
-            key = f"{type(obj).__name__}.{obj.id}"
-            if key in self.__objects:
-                del self.__objects[key]
+            cls_name = type(obj).__name__
+            key = f"{cls_name}.{obj.id}"
+            self.__ensure_loaded(cls_name)
+            if self.__get_key(cls_name, key) is not None:
+                self.__discard(key)
+                self.__dirty.discard(key)
+                self.__deleted.add(key)
+
+    def stats(self):
+        """Operation metrics, objects per class and bytes on disk
+
+        Safe to call from another thread: objects are counted from what
+        is in memory without loading, refreshing or re-bucketing, so
+        classes whose shards are not loaded yet are left out.
+        """
+        objects = {}
+        for name in self.classes:
+            if self.__sharded and name not in self.__loaded:
+                continue
+            objects[name] = len(self.__by_class.get(name, ())) + \
+                len(self.__pending.get(name, ()))
+        paths = [self.journal_path, self.journal_path + ".old"]
+        try:
+            paths += [entry.path for entry in os.scandir(self.snapshot_path)]
+        except (NotADirectoryError, FileNotFoundError):
+            paths.append(self.snapshot_path)
+        persisted = 0
+        for path in paths:
+            try:
+                persisted += getsize(path)
+            except OSError:
+                # Replaced or removed by a concurrent save
+                pass
+        return {"operations": self.metrics.snapshot(), "objects": objects,
+                "persisted_bytes": persisted}
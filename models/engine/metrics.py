@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+"""Operation counters and latency histograms for the storage engines
+
+The engines time their all(), new(), save(), delete() and reload()
+calls, and the persist that save() ends in (immediately, or later when
+batched or written behind), through the timed() decorator. stats()
+on an engine returns these with the number of objects per class and
+the bytes persisted:
+
+    {"operations": {"save": {"count": 3, "errors": 0, "seconds": 0.004,
+                             "buckets": {0.0001: 0, ..., inf: 3}}, ...},
+     "objects": {"Place": 12, ...},
+     "persisted_bytes": 5120}
+
+Setting HBNB_METRICS_FILE makes models write them in the Prometheus
+text format to that file every HBNB_METRICS_INTERVAL seconds (15 by
+default) and at exit, for a textfile collector or sidecar to scrape.
+"""
+
+import atexit
+import functools
+import math
+import os
+import threading
+import time
+
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Metrics:
+    """Thread-safe call counts and latency histograms per operation"""
+
+    def __init__(self, buckets=BUCKETS):
+        """Histograms use the upper bounds of buckets, plus infinity"""
+        self.__bounds = tuple(sorted(buckets)) + (math.inf,)
+        self.__lock = threading.Lock()
+        self.__ops = {}
+
+    def observe(self, op, seconds, error=False):
+        """Record one call of op that took seconds"""
+        with self.__lock:
+            entry = self.__ops.get(op)
+            if entry is None:
+                entry = self.__ops[op] = {
+                    "count": 0, "errors": 0, "seconds": 0.0,
+                    "buckets": [0] * len(self.__bounds)}
+            entry["count"] += 1
+            entry["errors"] += error
+            entry["seconds"] += seconds
+            for i, bound in enumerate(self.__bounds):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+                    break
+
+    def snapshot(self):
+        """Copy of the operations, with cumulative bucket counts by bound"""
+        with self.__lock:
+            ops = {}
+            for op, entry in self.__ops.items():
+                total, buckets = 0, {}
+                for bound, count in zip(self.__bounds, entry["buckets"]):
+                    total += count
+                    buckets[bound] = total
+                ops[op] = dict(entry, buckets=buckets)
+            return ops
+
+    def reset(self):
+        """Forget every observation"""
+        with self.__lock:
+            self.__ops.clear()
+
+
+def timed(op):
+    """Decorate a storage method to record its calls under op
+
+    The engine keeps its Metrics in its metrics attribute.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = method(self, *args, **kwargs)
+            except Exception:
+                self.metrics.observe(op, time.perf_counter() - start,
+                                     error=True)
+                raise
+            self.metrics.observe(op, time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorate
+
+
+def _label(value):
+    """Escape a Prometheus label value"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+        .replace("\n", "\\n")
+
+
+def _bound(bound):
+    """Prometheus le label of a bucket bound"""
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+def prometheus_text(stats, engine="storage"):
+    """Render stats() in the Prometheus text exposition format"""
+    engine = _label(engine)
+    lines = []
+    ops = stats.get("operations", {})
+
+    lines.append("# HELP hbnb_storage_operations_total "
+                 "Storage calls by operation.")
+    lines.append("# TYPE hbnb_storage_operations_total counter")
+    for op, entry in sorted(ops.items()):
+        lines.append('hbnb_storage_operations_total{{engine="{}",op="{}"}} '
+                     '{}'.format(engine, _label(op), entry["count"]))
+
+    lines.append("# HELP hbnb_storage_operation_errors_total "
+                 "Storage calls that raised, by operation.")
+    lines.append("# TYPE hbnb_storage_operation_errors_total counter")
+    for op, entry in sorted(ops.items()):
+        lines.append('hbnb_storage_operation_errors_total{{engine="{}",'
+                     'op="{}"}} {}'.format(engine, _label(op),
+                                           entry["errors"]))
+
+    lines.append("# HELP hbnb_storage_operation_seconds "
+                 "Storage call latency by operation.")
+    lines.append("# TYPE hbnb_storage_operation_seconds histogram")
+    for op, entry in sorted(ops.items()):
+        labels = 'engine="{}",op="{}"'.format(engine, _label(op))
+        for bound, count in entry["buckets"].items():
+            lines.append('hbnb_storage_operation_seconds_bucket{{{},le="{}"}} '
+                         '{}'.format(labels, _bound(bound), count))
+        lines.append("hbnb_storage_operation_seconds_sum{{{}}} {!r}".format(
+            labels, entry["seconds"]))
+        lines.append("hbnb_storage_operation_seconds_count{{{}}} {}".format(
+            labels, entry["count"]))
+
+    lines.append("# HELP hbnb_storage_objects Stored objects by class.")
+    lines.append("# TYPE hbnb_storage_objects gauge")
+    for cls_name, count in sorted(stats.get("objects", {}).items()):
+        lines.append('hbnb_storage_objects{{engine="{}",class="{}"}} {}'
+                     .format(engine, _label(cls_name), count))
+
+    if stats.get("persisted_bytes") is not None:
+        lines.append("# HELP hbnb_storage_persisted_bytes "
+                     "Bytes held by the persisted data.")
+        lines.append("# TYPE hbnb_storage_persisted_bytes gauge")
+        lines.append('hbnb_storage_persisted_bytes{{engine="{}"}} {}'.format(
+            engine, stats["persisted_bytes"]))
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(storage, path):
+    """Atomically replace path with the Prometheus text of storage"""
+    text = prometheus_text(storage.stats(), type(storage).__name__)
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class MetricsWriter:
+    """Writes the metrics of a storage engine to a file periodically
+
+    A process runs at most one writer per file, so a scraper never sees
+    two sets of counters take turns.
+    """
+
+    __paths = set()
+    __paths_lock = threading.Lock()
+
+    def __init__(self, storage, path, interval=15.0):
+        """Write every interval seconds from a daemon thread and at exit"""
+        self.storage = storage
+        self.path = path
+        self.interval = interval
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+
+    def start(self):
+        """Start the writer thread, unless the file already has a writer"""
+        with self.__paths_lock:
+            path = os.path.abspath(self.path)
+            if path in self.__paths:
+                return self
+            self.__paths.add(path)
+        self.__thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def write(self):
+        """Write the file now, errors are left to the next attempt"""
+        try:
+            write_prometheus(self.storage, self.path)
+        except Exception:
+            pass
+
+    def __run(self):
+        """Write until stopped"""
+        while not self.__stop.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        """Stop the thread and write a last time"""
+        self.__stop.set()
+        self.write()
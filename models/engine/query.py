@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+"""Filter parsing shared by the storage engines' query()
+
+Filters are keyword arguments naming an attribute, optionally followed
+by a double underscore and an operator:
+
+    storage.query(Place, city_id=city.id, price_by_night__lt=100,
+                  order_by="-price_by_night", limit=10)
+
+Operators are eq (the default), ne, lt, le, gt, ge and in.
+"""
+
+import operator
+
+OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "in": lambda value, values: value in values
+}
+
+
+def parse_filters(filters):
+    """Return filters as a list of (attribute, operator, value)"""
+    parsed = []
+    for name, value in filters.items():
+        attr, _, op = name.rpartition("__")
+        if not attr or op not in OPERATORS:
+            attr, op = name, "eq"
+        if op == "in":
+            value = list(value)
+        parsed.append((attr, op, value))
+    return parsed
+
+
+def parse_order(order_by):
+    """Return order_by as a list of (attribute, descending)"""
+    if not order_by:
+        return []
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    return [(name.lstrip("-"), name.startswith("-")) for name in order_by]
+
+
+def matches(value, op, expected):
+    """Apply operator op, treating comparisons with None as no match"""
+    if value is None and op not in ("eq", "ne", "in"):
+        return False
+    try:
+        return OPERATORS[op](value, expected)
+    except TypeError:
+        return False
+
+
+def sort_objects(objects, order_by):
+    """Sort objects in place by the attributes of order_by, None first"""
+    for attr, descending in reversed(parse_order(order_by)):
+        objects.sort(key=lambda obj: (getattr(obj, attr, None) is not None,
+                                      getattr(obj, attr, None)),
+                     reverse=descending)
+    return objects
@@ -0,0 +1,30 @@
+#!/usr/bin/python3
+"""Add the indexes declared by the models to an existing HBNB database
+
+Usage: HBNB_TYPE_STORAGE=db python3 -m models.engine.schema_upgrade [--sql]
+
+The database is the one DBStorage would use (HBNB_MYSQL_* or
+HBNB_DB_URL). With --sql the missing CREATE INDEX statements are only
+printed, to be reviewed or run by hand.
+"""
+
+import sys
+
+
+def main(argv):
+    """Create (or with --sql print) the missing indexes"""
+    from models import storage
+    if not hasattr(storage, "upgrade_schema"):
+        print("** set HBNB_TYPE_STORAGE=db **", file=sys.stderr)
+        return 1
+    dry_run = "--sql" in argv
+    statements = storage.upgrade_schema(dry_run=dry_run)
+    for statement in statements:
+        print(statement + ";")
+    if not dry_run:
+        print("-- {} index(es) created".format(len(statements)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
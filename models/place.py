@@ -9,6 +9,8 @@ from models.review import Review
 from models.amenity import Amenity
 
 STORAGE_TYPE = getenv("HBNB_TYPE_STORAGE")  # detect storage type
+if STORAGE_TYPE == "async_db":
+    STORAGE_TYPE = "db"  # same mapped classes as DBStorage
 
 # Many-to-many table for DBDtorage
 if STORAGE_TYPE == "db":
@@ -26,16 +28,19 @@ class Place(BaseModel, Base if STORAGE_TYPE == "db" else object):
     if STORAGE_TYPE == "db":
         __tablename__ = 'places'
 
-        city_id = Column(String(60), ForeignKey("cities.id"), nullable=False)
-        user_id = Column(String(60), ForeignKey("users.id"), nullable=False)
+        city_id = Column(String(60), ForeignKey("cities.id"), nullable=False,
+                         index=True)
+        user_id = Column(String(60), ForeignKey("users.id"), nullable=False,
+                         index=True)
         name = Column(String(128), nullable=False)
         description = Column(String(1024), nullable=True)
         number_rooms = Column(Integer, nullable=False, default=0)
         number_bathrooms = Column(Integer, nullable=False, default=0)
         max_guest = Column(Integer, nullable=False, default=0)
-        price_by_night = Column(Integer, nullable=False, default=0)
-        latitude = Column(Float, nullable=True)
-        longitude = Column(Float, nullable=True)
+        price_by_night = Column(Integer, nullable=False, default=0,
+                                index=True)
+        latitude = Column(Float, nullable=True, index=True)
+        longitude = Column(Float, nullable=True, index=True)
 
         # Relationship for DBStorage
         user = relationship("User", back_populates="places")
@@ -61,23 +66,24 @@ class Place(BaseModel, Base if STORAGE_TYPE == "db" else object):
         longitude = 0.0
         amenity_ids = []
 
-        from models import storage
-        from models.review import Review
-        from models.amenity import Amenity
-
         @property
         def reviews(self):
             """Return list of review instances with place_id equal current place.id"""
-            return [r for r in storage.all(Review).values() if r.place_id == self.id]
-        
+            from models import storage
+            return storage.lookup(Review, "place_id", self.id)
+
         @property
         def amenities(self):
             """Return list of Amenity instances linked to this place"""
-            all_amenities = storage.all(Amenity).values()
-            return [a for a in all_amenities if a.id in self.amenity_ids]
-        
+            from models import storage
+            all_amenities = storage.all(Amenity)
+            return [all_amenities[f"Amenity.{amenity_id}"]
+                    for amenity_id in self.amenity_ids
+                    if f"Amenity.{amenity_id}" in all_amenities]
+
         @amenities.setter
         def amenities(self, obj):
             """Add Amenity.id to amenity_ids of obj is Amenity"""
             if isinstance(obj, Amenity)and obj.id not in self.amenity_ids:
-                self.amenity_ids.append(obj.id)
+                # Assign a new list so storage can re-index this place
+                self.amenity_ids = self.amenity_ids + [obj.id]
@@ -12,8 +12,10 @@ class Review(BaseModel, Base):
     __tablename__ = 'reviews'
 
     text = Column(String(1024), nullable=False)
-    place_id = Column(String(60), ForeignKey("places.id"), nullable=False)
-    user_id = Column(String(60), ForeignKey("users.id"), nullable=False)
+    place_id = Column(String(60), ForeignKey("places.id"), nullable=False,
+                      index=True)
+    user_id = Column(String(60), ForeignKey("users.id"), nullable=False,
+                     index=True)
 
     # Relationships
     user = relationship("User", back_populates="reviews")
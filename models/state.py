@@ -11,7 +11,7 @@ class State(BaseModel, Base):
 
     name = Column(String(128), nullable=False)
 
-    if getenv("HBNB_TYPE_STORAGE") == "db":
+    if getenv("HBNB_TYPE_STORAGE") in ("db", "async_db"):
         cities = relationship("City", backref="state",
                               cascade="all, delete, delete-orphan")
     else:
@@ -19,6 +19,4 @@ class State(BaseModel, Base):
         def cities(self):
             from models import storage
             from models.city import City
-            all_cities = storage.all(City)
-            return [city for city in all_cities.values()
-                    if city.state_id == self.id]
+            return storage.lookup(City, "state_id", self.id)
@@ -15,3 +15,8 @@ GRANT SELECT ON performance_schema.* TO 'hbnb_dev'@'localhost';
 
 -- Apply changes
 FLUSH PRIVILEGES;
+
+-- Tables and their indexes are created by DBStorage.reload(). To add the
+-- indexes declared by the models to an existing hbnb_dev_db, run:
+--   HBNB_TYPE_STORAGE=db HBNB_MYSQL_DB=hbnb_dev_db ... python3 -m models.engine.schema_upgrade
+-- (with --sql to print the CREATE INDEX statements instead)
@@ -4,9 +4,13 @@
 import unittest
 from unittest.mock import patch
 from io import StringIO
+import os
+import subprocess
 import sys
+import tempfile
 from os import getenv
-from console import HBNBCommand
+import json
+from console import HBNBCommand, JsonlProtocol, parse_dict
 from models.base_model import BaseModel
 from models.state import State
 from models.city import City
@@ -14,7 +18,12 @@ from models.user import User
 from models.place import Place
 from models.amenity import Amenity
 from models.review import Review
-from models.__init__ import storage
+from models import storage
+try:
+    import sqlalchemy  # noqa: F401
+    sqlalchemy_available = True
+except ImportError:
+    sqlalchemy_available = False
 
 
 class TestConsole(unittest.TestCase):
@@ -143,11 +152,53 @@ class TestConsole(unittest.TestCase):
         output = self.get_output()
         self.assertTrue(output.startswith('[') and output.endswith(']'))
 
+    def test_all_matches_list_output(self):
+        place = Place()
+        storage.new(place)
+        self.console.onecmd("all Place")
+        expected = str([str(obj) for obj in storage.all(Place).values()])
+        self.assertEqual(self.get_output(), expected)
+        storage.delete(place)
+
+    def test_all_stream_limit_offset(self):
+        places = [Place() for _ in range(3)]
+        for place in places:
+            storage.new(place)
+        expected = [str(obj) for obj in storage.iter_all(Place)]
+        self.console.onecmd("all --class Place --stream --offset 1 --limit=1")
+        self.assertEqual(self.get_output().splitlines(), expected[1:2])
+        for place in places:
+            storage.delete(place)
+
+    def test_all_invalid_options(self):
+        self.console.onecmd("all Place --limit x")
+        self.assertEqual(self.get_output(), "** invalid number **")
+        self.console.onecmd("all --class Nope")
+        self.assertTrue(self.get_output().endswith(
+            "** class doesn't exist **"))
+        self.console.onecmd("all --colour")
+        self.assertTrue(self.get_output().endswith("** invalid option **"))
+
     def test_count_command(self):
         self.console.onecmd("count BaseModel")
         output = self.get_output()
         self.assertTrue(output.isdigit())
 
+    def test_count_matches_storage(self):
+        place = Place()
+        storage.new(place)
+        self.console.onecmd("count Place")
+        self.assertEqual(self.get_output(), str(storage.count(Place)))
+        storage.delete(place)
+
+    def test_show_and_destroy_by_id(self):
+        place = Place()
+        storage.new(place)
+        self.console.onecmd("show Place " + place.id)
+        self.assertIn(place.id, self.get_output())
+        self.console.onecmd("destroy Place " + place.id)
+        self.assertIsNone(storage.get(Place, place.id))
+
     def test_destroy_missing_class(self):
         self.console.onecmd("destroy")
         output = self.get_output()
@@ -178,6 +229,283 @@ class TestConsole(unittest.TestCase):
         output = self.get_output()
         self.assertEqual(output, "** instance id missing **")
 
+    def test_source_reports_line_errors(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.hbnb',
+                                         delete=False) as f:
+            f.write('create Amenity name="Wifi"\n'
+                    '# comment\n'
+                    'create Nope\n'
+                    'Amenity.count()\n')
+        try:
+            self.console.onecmd("source {} --every 2".format(f.name))
+        finally:
+            os.remove(f.name)
+        lines = self.get_output().splitlines()
+        self.assertEqual(lines[1], "line 3: ** class doesn't exist **")
+        self.assertEqual(lines[-1], "** 1 of 3 commands failed **")
+        self.assertIsNotNone(storage.get("Amenity", lines[0]))
+        storage.delete(storage.get("Amenity", lines[0]))
+
+    def test_source_reports_commit_errors(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.hbnb',
+                                         delete=False) as f:
+            f.write('count Amenity\n'
+                    'bogus\n')
+        try:
+            with patch.object(storage, "begin"), \
+                    patch.object(storage, "commit",
+                                 side_effect=OSError("disk full")):
+                self.console.onecmd("source {}".format(f.name))
+        finally:
+            os.remove(f.name)
+        lines = self.get_output().splitlines()
+        self.assertEqual(lines[1:], ["line 2: *** Unknown syntax: bogus",
+                                     "** not persisted: disk full **",
+                                     "** 1 of 2 commands failed **"])
+
+    @unittest.skipUnless(sqlalchemy_available, "SQLAlchemy not installed")
+    def test_source_constraint_error_fails_one_line(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, HBNB_TYPE_STORAGE="db",
+                       HBNB_DB_URL="sqlite:///" +
+                       os.path.join(tmp, "hbnb.db"))
+            result = subprocess.run(
+                [sys.executable, os.path.abspath("console.py"), "--batch",
+                 "-"],
+                input='create State name="CA"\n'
+                      'create Place name="x"\n'
+                      'create State name="NV"\n'
+                      'count State\n',
+                env=env, capture_output=True, text=True)
+        errors = [line for line in result.stdout.splitlines()
+                  if line.startswith("line ")]
+        self.assertEqual(len(errors), 1, result.stderr)
+        self.assertTrue(errors[0].startswith("line 2: ** "))
+        self.assertIn("city_id", errors[0])
+        self.assertEqual(result.stdout.splitlines()[-2:],
+                         ["2", "** 1 of 4 commands failed **"])
+        self.assertEqual(result.stderr, "")
+
+    def test_source_missing_file(self):
+        self.console.onecmd("source")
+        self.assertEqual(self.get_output(), "** file name missing **")
+        self.console.onecmd("source /nonexistent/file --every 0")
+        self.assertTrue(self.get_output().endswith("** invalid number **"))
+
+    @unittest.skipIf(getenv("HBNB_TYPE_STORAGE") == "db",
+                     "FileStorage only")
+    def test_batch_mode_persists_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            console = os.path.abspath("console.py")
+            env = dict(os.environ,
+                       PYTHONPATH=os.path.dirname(console),
+                       HBNB_METRICS_FILE="metrics.prom")
+            result = subprocess.run(
+                [sys.executable, console, "--batch", "-"],
+                input="create Amenity\n" * 5 + "count Amenity\n",
+                cwd=tmp, env=env, capture_output=True, text=True)
+            with open(os.path.join(tmp, "file.json")) as f:
+                saved = f.read()
+            with open(os.path.join(tmp, "metrics.prom")) as f:
+                persists = [line.split()[-1] for line in f
+                            if line.startswith(
+                                "hbnb_storage_operations_total")
+                            and 'op="persist"' in line]
+        ids = result.stdout.split()
+        self.assertEqual(ids[-1], "5")
+        self.assertTrue(all(i in saved for i in ids[:5]))
+        self.assertEqual(persists, ["1"])
+
+    def test_update_dict_is_not_evaluated(self):
+        self.assertEqual(parse_dict("{'name': 'x', 'max_guest': 2}"),
+                         {'name': 'x', 'max_guest': 2})
+        self.assertIsNone(parse_dict("{'a': __import__('os').getcwd()}"))
+        self.assertIsNone(parse_dict("[1]"))
+        place = Place()
+        storage.new(place)
+        self.console.onecmd(self.console.precmd(
+            'Place.update("{}", {{"name": "Loft", "max_guest": "3"}})'
+            .format(place.id)))
+        self.assertEqual((place.name, place.max_guest), ("Loft", 3))
+        storage.delete(place)
+
+    def test_jsonl_protocol(self):
+        requests = [
+            {"id": 1, "cmd": "create", "class": "Amenity",
+             "attrs": {"name": "Wifi"}},
+            {"id": 2, "cmd": "nope"},
+            {"cmd": "create", "class": "State"},
+        ]
+        lines = StringIO("\n".join(map(json.dumps, requests)) +
+                         "\nnot json\n")
+        out = StringIO()
+        JsonlProtocol(batch_size=2).run(lines, out)
+        responses = [json.loads(line)
+                     for line in out.getvalue().splitlines()]
+        self.assertEqual(len(responses), 4)
+        self.assertEqual(responses[0]["id"], 1)
+        self.assertTrue(responses[0]["ok"])
+        self.assertEqual(responses[1], {"id": 2, "ok": False,
+                                        "error": "unknown command"})
+        self.assertEqual(responses[2]["error"], "name missing")
+        self.assertEqual(responses[3]["error"], "invalid request")
+        amenity_id = responses[0]["result"]
+        protocol = JsonlProtocol()
+        answer = json.loads(protocol.answer(json.dumps(
+            {"cmd": "update", "class": "Amenity", "instance": amenity_id,
+             "attrs": {"name": "Fiber"}})))
+        self.assertEqual(answer["result"]["name"], "Fiber")
+        answer = json.loads(protocol.answer(json.dumps(
+            {"cmd": "destroy", "class": "Amenity", "instance": amenity_id})))
+        self.assertTrue(answer["ok"])
+        self.assertIsNone(storage.get("Amenity", amenity_id))
+
+    def test_jsonl_unexpected_errors(self):
+        create = {"cmd": "create", "class": "Amenity", "attrs": {}}
+        lines = StringIO(json.dumps(dict(create, id=1)) + "\n" +
+                         json.dumps({"id": 2, "cmd": "count",
+                                     "class": "Amenity"}) + "\n")
+        out = StringIO()
+        with patch.object(JsonlProtocol, "create",
+                          side_effect=RuntimeError("mapper")):
+            JsonlProtocol().run(lines, out)
+        responses = [json.loads(line)
+                     for line in out.getvalue().splitlines()]
+        self.assertEqual(responses[0], {"id": 1, "ok": False,
+                                        "error": "mapper"})
+        self.assertTrue(responses[1]["ok"])
+
+        lines = StringIO(json.dumps(dict(create, id=3)) + "\n" +
+                         json.dumps({"id": 4, "cmd": "count",
+                                     "class": "Amenity"}) + "\n")
+        out = StringIO()
+        with patch.object(storage, "begin"), \
+                patch.object(storage, "commit",
+                             side_effect=OSError("disk full")):
+            JsonlProtocol().run(lines, out)
+        responses = [json.loads(line)
+                     for line in out.getvalue().splitlines()]
+        self.assertEqual(responses[0], {"id": 3, "ok": False,
+                                        "error": "not persisted: disk full"})
+        self.assertTrue(responses[1]["ok"])
+
+    @unittest.skipUnless(sqlalchemy_available, "SQLAlchemy not installed")
+    def test_jsonl_constraint_error_fails_one_request(self):
+        requests = [
+            {"id": 1, "cmd": "create", "class": "State",
+             "attrs": {"name": "CA"}},
+            {"id": 2, "cmd": "create", "class": "Place",
+             "attrs": {"name": "no city"}},
+            {"id": 3, "cmd": "create", "class": "State",
+             "attrs": {"name": "NV"}},
+            {"id": 4, "cmd": "count", "class": "State"},
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, HBNB_TYPE_STORAGE="db",
+                       HBNB_DB_URL="sqlite:///" +
+                       os.path.join(tmp, "hbnb.db"))
+            result = subprocess.run(
+                [sys.executable, os.path.abspath("console.py"), "--jsonl"],
+                input="".join(json.dumps(r) + "\n" for r in requests),
+                env=env, capture_output=True, text=True)
+        responses = [json.loads(line)
+                     for line in result.stdout.splitlines()]
+        self.assertEqual([r["ok"] for r in responses],
+                         [True, False, True, True], result.stderr)
+        self.assertIn("city_id", responses[1]["error"])
+        self.assertEqual(responses[3]["result"], 2)
+
+    def test_import_export_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "places.csv")
+            with open(source, "w") as f:
+                f.write('name,max_guest,latitude,amenity_ids\n'
+                        'Tripped,3,1.5,"[""a1""]"\n'
+                        'Bad,x,,\n')
+            self.console.onecmd("import Place {} --chunk 1".format(source))
+            lines = self.get_output().splitlines()
+            self.assertEqual(lines[0], "** {}:3: invalid literal for int()"
+                             " with base 10: 'x' **".format(source))
+            self.assertEqual(lines[1], "1")
+            loft = storage.query(Place, name="Tripped")[0]
+            self.assertEqual((loft.max_guest, loft.latitude,
+                              loft.amenity_ids), (3, 1.5, ["a1"]))
+            exported = os.path.join(tmp, "places.jsonl")
+            self.console.onecmd("export Place " + exported)
+            with open(exported) as f:
+                records = [json.loads(line) for line in f]
+            self.assertIn(loft.id, [record["id"] for record in records])
+            storage.delete(loft)
+            self.console.onecmd("import Place {} --format jsonl"
+                                .format(exported))
+            self.assertEqual(storage.get(Place, loft.id).amenity_ids, ["a1"])
+            self.console.onecmd("export Place " + source)
+            with open(source) as f:
+                self.assertTrue(f.readline().startswith("id,created_at"))
+            storage.delete(storage.get(Place, loft.id))
+
+    @unittest.skipUnless(sqlalchemy_available, "SQLAlchemy not installed")
+    def test_import_skips_chunks_the_database_refuses(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "states.jsonl")
+            with open(path, "w") as f:
+                f.write('{"name": "CA"}\n{"name": "NV"}\n'
+                        '{"id": "no-name"}\n{"name": "OR"}\n'
+                        '{"name": "WA"}\n')
+            env = dict(os.environ, HBNB_TYPE_STORAGE="db",
+                       HBNB_DB_URL="sqlite:///" +
+                       os.path.join(tmp, "hbnb.db"))
+            result = subprocess.run(
+                [sys.executable, os.path.abspath("console.py")],
+                input="import State {} --chunk 2\ncount State\n"
+                      .format(path),
+                env=env, capture_output=True, text=True)
+        self.assertIn("** {}:3-4: ".format(path), result.stdout)
+        self.assertIn("states.name", result.stdout)
+        self.assertEqual(result.stdout.split()[-4:],
+                         ["3", "(hbnb)", "3", "(hbnb)"])
+        self.assertEqual(result.stderr, "")
+
+    def test_import_errors(self):
+        self.console.onecmd("import Place")
+        self.assertEqual(self.get_output(), "** file name missing **")
+        self.console.onecmd("export Place out.xml --format xml")
+        self.assertTrue(self.get_output().endswith("** unknown format **"))
+
+    def test_timing_reports_storage_calls(self):
+        report = StringIO()
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch("sys.stderr", report):
+            self.console.onecmd("timing on --profile " + tmp)
+            try:
+                self.console.onecmd("count Amenity")
+                self.console.onecmd("all Amenity")
+            finally:
+                self.console.onecmd("timing off")
+            self.assertEqual(sorted(os.listdir(tmp)),
+                             ["0001-count.prof", "0002-all.prof"])
+        lines = report.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("[timing]"))
+        self.assertIn("ms total", lines[0])
+        self.assertTrue(any("iter_all" in line for line in lines))
+        self.assertNotIn("all", vars(storage))
+        self.console.onecmd("timing")
+        self.assertTrue(self.get_output().endswith("timing is off"))
+
+    def test_timing_reports_create_writes(self):
+        report = StringIO()
+        with patch("sys.stderr", report):
+            self.console.onecmd("timing on")
+            try:
+                self.console.onecmd('create Amenity name="Timed"')
+            finally:
+                self.console.onecmd("timing off")
+        calls = {line.split()[1]: line.split()[2]
+                 for line in report.getvalue().splitlines()[1:]}
+        self.assertEqual(calls.get("new"), "1")
+        self.assertEqual(calls.get("save"), "1")
+        storage.delete(storage.get(Amenity, self.get_output()))
+
     @unittest.skipIf(getenv("HBNB_TYPE_STORAGE") != "db",
                      "DBStorage not yet implemented")
     def test_dbstorage_skip(self):
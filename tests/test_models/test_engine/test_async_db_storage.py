@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+"""Unit tests for the AsyncDBStorage engine, against aiosqlite"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+try:
+    import aiosqlite  # noqa: F401
+    import greenlet  # noqa: F401
+    aiosqlite_available = True
+except ImportError:
+    aiosqlite_available = False
+
+ASYNC_SCRIPT = """
+import asyncio
+from models import storage
+from models.engine.async_db_storage import AsyncDBStorage
+from models.state import State
+from models.city import City
+
+async def main():
+    assert type(storage) is AsyncDBStorage
+    await storage.reload()
+    state = State(name="CA")
+    await storage.new(state)
+    for name in ("LA", "SF"):
+        await storage.new(City(name=name, state_id=state.id))
+    await storage.save()
+    await storage.close()
+    print(await storage.count(), await storage.count(City))
+    found = await storage.get(State, state.id, load="cities")
+    print(sorted(city.name for city in found.cities))
+    cities = await storage.query(City, name__ne="LA", order_by="name")
+    print([city.name for city in cities], len(await storage.all(City)))
+    await storage.delete(cities[0])
+    await storage.save()
+
+    async def other_task():
+        return await storage.count(City)
+    print(await asyncio.create_task(other_task()))
+    await storage.close()
+
+asyncio.run(main())
+"""
+
+SYNC_SCRIPT = """
+from models.amenity import Amenity
+amenity = Amenity(name="Wifi")
+for method in (amenity.save, amenity.delete):
+    try:
+        method()
+    except RuntimeError as e:
+        print(e)
+"""
+
+
+@unittest.skipUnless(aiosqlite_available, "aiosqlite not installed")
+class TestAsyncDBStorage(unittest.TestCase):
+    """Tests for AsyncDBStorage"""
+
+    def test_async_round_trip(self):
+        """new/save/get/query/all/count/delete through asyncio"""
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, HBNB_TYPE_STORAGE="async_db",
+                       HBNB_DB_URL="sqlite+aiosqlite:///" +
+                       os.path.join(tmp, "hbnb.db"))
+            result = subprocess.run([sys.executable, "-c", ASYNC_SCRIPT],
+                                    env=env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.splitlines(),
+                         ["3 2", "['LA', 'SF']", "['SF'] 2", "1"])
+
+    def test_sync_callers_are_refused(self):
+        """obj.save()/delete() and the console fail instead of not writing"""
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, HBNB_TYPE_STORAGE="async_db",
+                       HBNB_DB_URL="sqlite+aiosqlite:///" +
+                       os.path.join(tmp, "hbnb.db"))
+            result = subprocess.run([sys.executable, "-c", SYNC_SCRIPT],
+                                    env=env, capture_output=True, text=True)
+            console = subprocess.run(
+                [sys.executable, os.path.abspath("console.py")],
+                input="count Amenity\n", env=env, capture_output=True,
+                text=True)
+        lines = result.stdout.splitlines()
+        self.assertEqual(len(lines), 2, result.stderr)
+        self.assertTrue(lines[0].startswith("save() cannot persist"))
+        self.assertTrue(lines[1].startswith("delete() cannot persist"))
+        self.assertNotIn("never awaited", result.stderr)
+        self.assertEqual(console.returncode, 1)
+        self.assertIn("needs a synchronous storage engine", console.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+""" Module for testing the read-through storage cache"""
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from models.place import Place
+from models import storage
+from models.engine.cache import CachedStorage
+try:
+    from models.engine.file_storage import FileStorage
+    _has_filestorage = True
+except Exception:
+    _has_filestorage = False
+try:
+    import sqlalchemy
+    _has_sqlalchemy = True
+except ImportError:
+    _has_sqlalchemy = False
+
+THREADS_SCRIPT = """
+import threading
+from models import storage
+from models.amenity import Amenity
+amenity = Amenity(name="Wifi")
+storage.new(amenity)
+storage.save()
+storage.get(Amenity, amenity.id)
+errors = []
+
+
+def rename():
+    try:
+        obj = storage.get(Amenity, amenity.id)
+        obj.name = "Pool"
+        storage.new(obj)
+        storage.save()
+    except Exception as e:
+        errors.append(type(e).__name__)
+    finally:
+        storage.close()
+
+
+thread = threading.Thread(target=rename)
+thread.start()
+thread.join()
+print(errors or "ok", storage.cache_info()["entries"])
+"""
+
+
+@unittest.skipUnless(_has_filestorage and type(storage) is FileStorage,
+                     "Runs over FileStorage")
+class test_cachedStorage(unittest.TestCase):
+    """ Class to test CachedStorage over a FileStorage """
+
+    def setUp(self):
+        """ Wrap a storage holding one place """
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        self.place = Place(city_id="c1", name="Loft")
+        storage.new(self.place)
+        self.cache = CachedStorage(FileStorage(), size=2)
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove('file.json')
+        except OSError:
+            pass
+
+    def test_get_hits(self):
+        """ A repeated get() is answered from the cache """
+        for _ in range(3):
+            self.assertIs(self.cache.get(Place, self.place.id), self.place)
+        info = self.cache.cache_info()
+        self.assertEqual((info["hits"], info["misses"]), (2, 1))
+
+    def test_query_returns_copies(self):
+        """ query() results are cached but callers get their own list """
+        first = self.cache.query(Place, city_id="c1")
+        first.append(None)
+        self.assertEqual(self.cache.query(Place, city_id="c1"), [self.place])
+        self.assertEqual(self.cache.cache_info()["hits"], 1)
+
+    def test_new_and_save_invalidate(self):
+        """ new() drops the class entries, save() drops query results """
+        self.cache.query(Place, city_id="c1")
+        other = Place(city_id="c1")
+        self.cache.new(other)
+        self.assertEqual(len(self.cache.query(Place, city_id="c1")), 2)
+        self.cache.get(Place, other.id)
+        self.cache.save()
+        self.assertEqual(self.cache.cache_info()["entries"], 1)
+        self.cache.delete(other)
+        self.assertIsNone(self.cache.get(Place, other.id))
+
+    def test_lru_eviction(self):
+        """ The least recently used entry goes first """
+        self.cache.get(Place, "a")
+        self.cache.get(Place, "b")
+        self.cache.get(Place, "a")
+        self.cache.get(Place, "c")
+        info = self.cache.cache_info()
+        self.assertEqual((info["entries"], info["evictions"]), (2, 1))
+        self.cache.get(Place, "a")
+        self.assertEqual(self.cache.cache_info()["hits"], 2)
+
+    def test_ttl(self):
+        """ Entries older than the TTL are reloaded """
+        cache = CachedStorage(FileStorage(), ttl=10)
+        cache.get(Place, self.place.id)
+        with patch("time.monotonic", return_value=time.monotonic() + 11):
+            cache.get(Place, self.place.id)
+        self.assertEqual(cache.cache_info()["misses"], 2)
+
+    def test_memory_budget(self):
+        """ Entries are evicted to stay under max_bytes """
+        cache = CachedStorage(FileStorage(), max_bytes=2000)
+        for _ in range(5):
+            cache.new(Place(city_id="c1"))
+        cache.query(Place)
+        self.assertEqual(cache.cache_info()["entries"], 0)
+        cache.get(Place, self.place.id)
+        info = cache.cache_info()
+        self.assertLessEqual(info["bytes"], 2000)
+        self.assertEqual(info["entries"], 1)
+
+    def test_forwards_other_calls(self):
+        """ Everything else goes to the wrapped engine """
+        self.assertEqual(self.cache.count(Place), 1)
+
+    def test_entries_are_per_thread(self):
+        """ Another thread loads its own objects, close() drops them """
+        self.cache.get(Place, self.place.id)
+        infos = []
+
+        def lookup():
+            self.cache.get(Place, self.place.id)
+            infos.append(self.cache.cache_info())
+            self.cache.close()
+
+        thread = threading.Thread(target=lookup)
+        thread.start()
+        thread.join()
+        self.assertEqual((infos[0]["misses"], infos[0]["entries"]), (2, 2))
+        self.assertEqual(self.cache.cache_info()["entries"], 1)
+
+
+@unittest.skipUnless(_has_sqlalchemy, "SQLAlchemy not installed")
+class test_cachedDBStorage(unittest.TestCase):
+    """ Class to test CachedStorage over DBStorage on SQLite """
+
+    def test_threads_keep_their_sessions(self):
+        """ A thread never gets objects of another thread's session """
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, HBNB_TYPE_STORAGE="db",
+                       HBNB_CACHE_SIZE="10",
+                       HBNB_DB_URL="sqlite:///" + os.path.join(tmp, "hbnb.db"))
+            result = subprocess.run([sys.executable, "-c", THREADS_SCRIPT],
+                                    env=env, capture_output=True, text=True,
+                                    check=True)
+        self.assertEqual(result.stdout.split(), ["ok", "0"])
@@ -1,6 +1,10 @@
 #!/usr/bin/python3
 """Unit tests for DBStorage engine"""
 
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
 from os import getenv
 
@@ -80,5 +84,332 @@ class TestDBStorage(unittest.TestCase):
             self.fail(f"reload() raised an exception: {e}")
 
 
+
+THREADS_SCRIPT = """
+import threading
+from models import storage
+from models.state import State
+sessions = []
+errors = []
+
+def work(n):
+    try:
+        for i in range(20):
+            storage.new(State(name="{}-{}".format(n, i)))
+            storage.save()
+        sessions.append(storage._DBStorage__session())
+        storage.close()
+    except Exception as e:
+        errors.append(e)
+
+threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+print(len(errors), len(set(map(id, sessions))), storage.count(State))
+"""
+
+WRITE_BEHIND_SCRIPT = """
+import sys
+import threading
+from models import storage
+from models.state import State
+if sys.argv[1] == "write":
+    def work():
+        storage.new(State(name="worker"))
+        storage.save()
+        storage.close()
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+    print(storage.count(State))
+    storage.new(State(name="main"))
+    storage.save()
+else:
+    print(storage.count(State))
+"""
+
+BULK_SCRIPT = """
+from sqlalchemy import create_engine
+from models import storage
+from models.state import State
+storage._DBStorage__engine = create_engine("sqlite://")
+storage.reload()
+state = State(name="a")
+storage.new(state)
+storage.save()
+print(storage.bulk_new([State(name=str(i)) for i in range(5)], chunk_size=2))
+print(storage.bulk_upsert(State, [{"id": state.id, "name": "b"},
+                                  {"name": "c"}]))
+print(storage.count(State), state.name)
+"""
+
+PARTIAL_UPSERT_SCRIPT = """
+from sqlalchemy import create_engine
+from models import storage
+from models.state import State
+from models.city import City
+from models.user import User
+from models.place import Place
+storage._DBStorage__engine = create_engine("sqlite://")
+storage.reload()
+state = State(name="CA")
+city = City(name="SF", state_id=state.id)
+user = User(email="a@b.c", password="pwd")
+place = Place(name="old", city_id=city.id, user_id=user.id, max_guest=4)
+for obj in (state, city, user, place):
+    storage.new(obj)
+    storage.save()
+print(storage.bulk_upsert(Place, [{"id": place.id, "name": "new"},
+                                  {"name": "other", "city_id": city.id,
+                                   "user_id": user.id}]))
+print(storage.count(Place), place.name, place.max_guest,
+      place.city_id == city.id)
+"""
+
+LOAD_SCRIPT = """
+from sqlalchemy import create_engine, event
+from models import storage
+from models.state import State
+from models.city import City
+from models.user import User
+from models.place import Place
+from models.review import Review
+engine = create_engine("sqlite://")
+storage._DBStorage__engine = engine
+storage.reload()
+user = User(email="a@b.c", password="pwd")
+objs = [user]
+for s in range(2):
+    state = State(name=str(s))
+    objs.append(state)
+    for c in range(2):
+        city = City(name=str(c), state_id=state.id)
+        objs.append(city)
+        for p in range(2):
+            place = Place(name=str(p), city_id=city.id, user_id=user.id)
+            objs.append(place)
+            objs.extend(Review(text="t", place_id=place.id, user_id=user.id)
+                        for r in range(2))
+storage.bulk_new(objs)
+statements = []
+event.listen(engine, "before_cursor_execute",
+             lambda *args: statements.append(args[2]))
+
+def walk(states):
+    return sum(len(place.reviews) for state in states
+               for city in state.cities for place in city.places)
+
+for load in (None, "cities.places.reviews"):
+    storage.close()
+    del statements[:]
+    print(walk(storage.all(State, load=load).values()), len(statements))
+storage.close()
+del statements[:]
+state = storage.query(State, name="0", load=["cities.places.reviews"])[0]
+print(walk([state]), len(statements))
+storage.close()
+del statements[:]
+place = storage.get(Place, place.id, load="city")
+print(place.city.name, len(statements))
+"""
+
+
+SQLITE_SCRIPT = """
+import sys
+from models import storage
+from models.state import State
+if sys.argv[1] == "write":
+    storage.new(State(name="CA"))
+    storage.save()
+with storage._DBStorage__engine.connect() as conn:
+    for pragma in ("journal_mode", "synchronous", "mmap_size"):
+        print(conn.exec_driver_sql("PRAGMA " + pragma).scalar())
+print(storage.count(State))
+"""
+
+SHARED_CACHE_SCRIPT = """
+import threading
+from models import storage
+from models.state import State
+storage.new(State(name="CA"))
+storage.save()
+counts = []
+thread = threading.Thread(target=lambda: counts.append(storage.count()))
+thread.start()
+thread.join()
+print(counts[0])
+"""
+
+DROP_INDEXES_SCRIPT = """
+from models import storage
+with storage._DBStorage__engine.begin() as conn:
+    conn.exec_driver_sql("DROP INDEX ix_places_city_id")
+    conn.exec_driver_sql("DROP INDEX ix_reviews_user_id")
+"""
+
+STATS_SCRIPT = """
+from models import storage
+from models.amenity import Amenity
+storage.new(Amenity(name="Wifi"))
+storage.save()
+stats = storage.stats()
+print(stats["operations"]["save"]["count"],
+      stats["operations"]["persist"]["count"],
+      stats["objects"]["Amenity"], stats["persisted_bytes"] > 0)
+"""
+
+SAVEPOINT_SCRIPT = """
+from models import storage
+from models.state import State
+from models.place import Place
+storage.begin()
+with storage.savepoint():
+    State(name="a").save()
+try:
+    with storage.savepoint():
+        Place(name="no city").save()
+except Exception as e:
+    print(type(e).__name__)
+with storage.savepoint():
+    State(name="b").save()
+storage.commit()
+storage.begin()
+with storage.savepoint():
+    State(name="c").save()
+storage.rollback()
+print(storage.count(State), storage.count(Place))
+"""
+
+
+def run_db_script(script, *args, **env):
+    """Run script in a db-mode interpreter, return its output words"""
+    env = dict(os.environ, HBNB_TYPE_STORAGE="db", **env)
+    result = subprocess.run([sys.executable, "-c", script] + list(args),
+                            env=env, capture_output=True, text=True,
+                            check=True)
+    return result.stdout.split()
+
+
+@unittest.skipUnless(sqlalchemy_available, "SQLAlchemy not installed")
+class TestDBStorageSQLite(unittest.TestCase):
+    """Tests for the embedded SQLite backend selected by HBNB_DB_URL"""
+
+    def test_file_database_persists_in_wal_mode(self):
+        """Rows survive the process, connections use the tuned pragmas"""
+        with tempfile.TemporaryDirectory() as tmp:
+            url = "sqlite:///" + os.path.join(tmp, "hbnb.db")
+            run_db_script(SQLITE_SCRIPT, "write", HBNB_DB_URL=url)
+            output = run_db_script(SQLITE_SCRIPT, "read", HBNB_DB_URL=url,
+                                   HBNB_SQLITE_MMAP_SIZE="1048576")
+        self.assertEqual(output, ["wal", "1", "1048576", "1"])
+
+    def test_shared_cache_memory_database(self):
+        """In shared-cache mode every connection sees one memory database"""
+        output = run_db_script(SHARED_CACHE_SCRIPT, HBNB_DB_URL="sqlite://",
+                               HBNB_SQLITE_SHARED_CACHE="1")
+        self.assertEqual(output, ["1"])
+
+
+@unittest.skipUnless(sqlalchemy_available, "SQLAlchemy not installed")
+class TestDBStorageBulk(unittest.TestCase):
+    """Tests for bulk_new() and bulk_upsert(), against SQLite"""
+
+    def test_bulk_new_and_upsert(self):
+        """Chunked inserts land and upserts update loaded objects"""
+        self.assertEqual(run_db_script(BULK_SCRIPT),
+                         ["5", "2", "7", "b"])
+
+    def test_upsert_partial_rows_of_stored_objects(self):
+        """A stored id with only some columns updates just those"""
+        self.assertEqual(run_db_script(PARTIAL_UPSERT_SCRIPT),
+                         ["2", "2", "new", "4", "True"])
+
+
+@unittest.skipUnless(sqlalchemy_available, "SQLAlchemy not installed")
+class TestDBStorageSavepoint(unittest.TestCase):
+    """Tests for savepoint(), against SQLite"""
+
+    def test_savepoint_undoes_only_its_block(self):
+        """A failing block is undone alone, a batch rollback undoes all"""
+        with tempfile.TemporaryDirectory() as tmp:
+            output = run_db_script(
+                SAVEPOINT_SCRIPT,
+                HBNB_DB_URL="sqlite:///" + os.path.join(tmp, "hbnb.db"))
+        self.assertEqual(output, ["IntegrityError", "2", "0"])
+
+
+@unittest.skipUnless(sqlalchemy_available, "SQLAlchemy not installed")
+class TestDBStorageStats(unittest.TestCase):
+    """Tests for DBStorage.stats()"""
+
+    def test_stats(self):
+        """Saves, committed rows and the database size are reported"""
+        with tempfile.TemporaryDirectory() as tmp:
+            output = run_db_script(
+                STATS_SCRIPT,
+                HBNB_DB_URL="sqlite:///" + os.path.join(tmp, "hbnb.db"))
+        self.assertEqual(output, ["1", "1", "1", "True"])
+
+
+@unittest.skipUnless(sqlalchemy_available, "SQLAlchemy not installed")
+class TestDBStorageEagerLoad(unittest.TestCase):
+    """Tests for the load= option, counting the SQL statements run"""
+
+    def test_load_fixes_query_count(self):
+        """A loaded hierarchy takes one query per level, not per object"""
+        self.assertEqual(run_db_script(LOAD_SCRIPT),
+                         ["16", "15", "16", "4", "8", "4", "1", "1"])
+
+
+@unittest.skipUnless(sqlalchemy_available, "SQLAlchemy not installed")
+class TestDBStorageSchemaUpgrade(unittest.TestCase):
+    """Tests for upgrade_schema() and its command line"""
+
+    def upgrade(self, url, *args):
+        """Run the schema upgrade command, return its output lines"""
+        env = dict(os.environ, HBNB_TYPE_STORAGE="db", HBNB_DB_URL=url)
+        result = subprocess.run(
+            [sys.executable, "-m", "models.engine.schema_upgrade"] +
+            list(args), env=env, capture_output=True, text=True, check=True)
+        return result.stdout.splitlines()
+
+    def test_missing_indexes_are_created(self):
+        """Indexes absent from an existing database are added once"""
+        with tempfile.TemporaryDirectory() as tmp:
+            url = "sqlite:///" + os.path.join(tmp, "hbnb.db")
+            run_db_script(DROP_INDEXES_SCRIPT, HBNB_DB_URL=url)
+            self.assertEqual(self.upgrade(url, "--sql"), [
+                "CREATE INDEX ix_places_city_id ON places (city_id);",
+                "CREATE INDEX ix_reviews_user_id ON reviews (user_id);"])
+            self.assertEqual(self.upgrade(url)[-1],
+                             "-- 2 index(es) created")
+            self.assertEqual(self.upgrade(url, "--sql"), [])
+
+
+@unittest.skipUnless(sqlalchemy_available, "SQLAlchemy not installed")
+class TestDBStorageThreads(unittest.TestCase):
+    """Tests for per-thread sessions, against SQLite"""
+
+    def test_threads_use_their_own_sessions(self):
+        """Concurrent savers each get a session and lose no rows"""
+        with tempfile.TemporaryDirectory() as tmp:
+            output = run_db_script(
+                THREADS_SCRIPT,
+                HBNB_DB_URL="sqlite:///" + os.path.join(tmp, "hbnb.db"))
+        self.assertEqual(output, ["0", "8", "160"])
+
+    def test_write_behind_flushes_on_the_owning_thread(self):
+        """close() commits a thread's owed writes, exit the main one's"""
+        with tempfile.TemporaryDirectory() as tmp:
+            url = "sqlite:///" + os.path.join(tmp, "hbnb.db")
+            output = run_db_script(WRITE_BEHIND_SCRIPT, "write",
+                                   HBNB_DB_URL=url, HBNB_WRITE_BEHIND="60")
+            output += run_db_script(WRITE_BEHIND_SCRIPT, "read",
+                                    HBNB_DB_URL=url)
+        self.assertEqual(output, ["1", "2"])
+
+
 if __name__ == "__main__":
     unittest.main()
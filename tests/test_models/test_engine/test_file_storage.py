@@ -2,9 +2,18 @@
 """ Module for testing file storage"""
 import unittest
 from models.base_model import BaseModel
+from models.place import Place
+from models.amenity import Amenity
 from models import storage
 import os
+import sys
+import json
+import shutil
+import subprocess
+from unittest.mock import patch
 try:
+    from models.engine import binary_snapshot
+    from models.engine.column_store import ColumnTable
     from models.engine.file_storage import FileStorage
     _has_filestorage = True
 except Exception:
@@ -117,3 +126,739 @@ class test_fileStorage(unittest.TestCase):
         from models.engine.file_storage import FileStorage
         print(type(storage))
         self.assertEqual(type(storage), FileStorage)
+
+    def test_all_cls(self):
+        """ all(cls) returns only objects of that class """
+        bm = BaseModel()
+        place = Place()
+        storage.new(bm)
+        storage.new(place)
+        places = storage.all(Place)
+        self.assertEqual(list(places.keys()), ['Place.' + place.id])
+        self.assertEqual(list(storage.all('BaseModel').keys()),
+                         ['BaseModel.' + bm.id])
+
+    def test_all_cls_read_only(self):
+        """ all(cls) is a read-only view that follows new() and delete() """
+        places = storage.all(Place)
+        with self.assertRaises(TypeError):
+            places['Place.x'] = Place()
+        place = Place()
+        storage.new(place)
+        self.assertIn('Place.' + place.id, places)
+        storage.delete(place)
+        self.assertNotIn('Place.' + place.id, places)
+
+    def test_all_cls_after_direct_delete(self):
+        """ Removing from all() directly is reflected by all(cls) """
+        place = Place()
+        storage.new(place)
+        del storage.all()['Place.' + place.id]
+        self.assertEqual(len(storage.all(Place)), 0)
+
+    def test_iter_all(self):
+        """ iter_all() yields the objects of a class or of every class """
+        bm = BaseModel()
+        place = Place()
+        storage.new(bm)
+        storage.new(place)
+        self.assertEqual(list(storage.iter_all(Place)), [place])
+        self.assertEqual(list(storage.iter_all("Amenity")), [])
+        self.assertCountEqual(storage.iter_all(), [bm, place])
+
+    def test_count(self):
+        """ count() counts one class or every object """
+        storage.new(BaseModel())
+        storage.new(Place())
+        storage.new(Place())
+        self.assertEqual(storage.count(Place), 2)
+        self.assertEqual(storage.count("BaseModel"), 1)
+        self.assertEqual(storage.count("Nope"), 0)
+        self.assertEqual(storage.count(), 3)
+
+    def test_bulk_new(self):
+        """ bulk_new() stores and saves every object """
+        places = [Place(city_id="c1") for _ in range(3)]
+        self.assertEqual(storage.bulk_new(places), 3)
+        self.assertEqual(len(storage.lookup(Place, "city_id", "c1")), 3)
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 3)
+
+    def test_bulk_upsert(self):
+        """ bulk_upsert() updates known ids and adds the other rows """
+        place = Place(name="Old")
+        storage.new(place)
+        self.assertEqual(storage.bulk_upsert(Place, [
+            {"id": place.id, "name": "New", "city_id": "c1"},
+            {"name": "Added", "city_id": "c1"}]), 2)
+        self.assertEqual(place.name, "New")
+        names = sorted(p.name for p in storage.lookup(Place, "city_id", "c1"))
+        self.assertEqual(names, ["Added", "New"])
+        self.assertEqual(storage.bulk_upsert("Nope", [{}]), 0)
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    def test_lookup(self):
+        """ lookup() answers foreign keys from the reverse index """
+        here = Place(city_id="c1", user_id="u1")
+        there = Place(city_id="c2", user_id="u1")
+        storage.new(here)
+        storage.new(there)
+        self.assertEqual(storage.lookup(Place, "city_id", "c1"), [here])
+        self.assertEqual(len(storage.lookup(Place, "user_id", "u1")), 2)
+        self.assertEqual(storage.lookup(Place, "city_id", "c3"), [])
+
+    def test_lookup_follows_attribute_changes(self):
+        """ Changing an indexed attribute moves the object in the index """
+        place = Place(city_id="c1")
+        storage.new(place)
+        place.city_id = "c2"
+        self.assertEqual(storage.lookup(Place, "city_id", "c1"), [])
+        self.assertEqual(storage.lookup(Place, "city_id", "c2"), [place])
+        storage.delete(place)
+        self.assertEqual(storage.lookup(Place, "city_id", "c2"), [])
+
+    def test_only_stored_objects_are_tracked(self):
+        """ The change hook is set by new() and kept out of to_dict() """
+        place = Place(name="Loft")
+        self.assertNotIn("_storage_changed", place.__dict__)
+        storage.new(place)
+        self.assertIn("_storage_changed", place.__dict__)
+        self.assertNotIn("_storage_changed", place.to_dict())
+        storage.delete(place)
+
+    def test_lookup_amenity_places(self):
+        """ Places are indexed under each of their amenity ids """
+        amenity = Amenity()
+        place = Place()
+        storage.new(amenity)
+        storage.new(place)
+        place.amenities = amenity
+        self.assertEqual(storage.lookup(Place, "amenity_ids", amenity.id),
+                         [place])
+        self.assertEqual(place.amenities, [amenity])
+        self.assertEqual(Place.amenity_ids, [])
+
+
+@unittest.skipUnless(_has_filestorage and type(storage) is FileStorage,
+                     "FileStorage tests only")
+class test_fileStorage_journal(unittest.TestCase):
+    """ Class to test the append-only journal mode """
+
+    def setUp(self):
+        """ Set up a journaled storage over an empty object set """
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        with patch.dict(os.environ, {"HBNB_FILE_JOURNAL": "1"}):
+            self.storage = FileStorage()
+        self.storage.save()
+
+    def tearDown(self):
+        """ Remove snapshot and journal files """
+        for path in ('file.json', 'file.json.log', 'file.json.log.old'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def test_save_appends_to_journal(self):
+        """ save() appends changed objects instead of rewriting file.json """
+        self.storage.compact()
+        before = os.path.getsize('file.json')
+        new = BaseModel()
+        self.storage.new(new)
+        self.storage.save()
+        self.assertEqual(os.path.getsize('file.json'), before)
+        with open('file.json.log') as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["key"], "BaseModel." + new.id)
+
+    def test_save_only_dirty(self):
+        """ Objects untouched since the last save are not journaled again """
+        first = BaseModel()
+        self.storage.new(first)
+        self.storage.save()
+        second = BaseModel()
+        self.storage.new(second)
+        self.storage.save()
+        with open('file.json.log') as f:
+            keys = [json.loads(line)["key"] for line in f]
+        self.assertEqual(keys, ["BaseModel." + first.id,
+                                "BaseModel." + second.id])
+
+    def test_reload_replays_journal(self):
+        """ reload() rebuilds objects from snapshot plus journal """
+        kept = BaseModel()
+        gone = BaseModel()
+        self.storage.new(kept)
+        self.storage.new(gone)
+        self.storage.save()
+        self.storage.delete(gone)
+        self.storage.save()
+        del storage.all()["BaseModel." + kept.id]
+        self.storage.reload()
+        self.assertIn("BaseModel." + kept.id, storage.all())
+        self.assertNotIn("BaseModel." + gone.id, storage.all())
+
+    def test_save_attribute_changes(self):
+        """ Attributes set on a stored object are journaled by save() """
+        amenity = Amenity(name="old")
+        self.storage.new(amenity)
+        self.storage.save()
+        amenity.name = "renamed"
+        self.storage.save()
+        del storage.all()["Amenity." + amenity.id]
+        self.storage.reload()
+        self.assertEqual(self.storage.get(Amenity, amenity.id).name,
+                         "renamed")
+
+    def test_compact(self):
+        """ compact() folds the journal into file.json """
+        new = BaseModel()
+        self.storage.new(new)
+        self.storage.save()
+        self.storage.compact(wait=True)
+        self.assertFalse(os.path.exists('file.json.log'))
+        self.assertFalse(os.path.exists('file.json.log.old'))
+        with open('file.json') as f:
+            self.assertIn("BaseModel." + new.id, json.load(f))
+
+    def test_compact_threshold(self):
+        """ Crossing the size threshold triggers a background compaction """
+        with patch.dict(os.environ, {"HBNB_FILE_JOURNAL": "1",
+                                     "HBNB_JOURNAL_COMPACT_BYTES": "1"}):
+            journaled = FileStorage()
+        new = BaseModel()
+        journaled.new(new)
+        journaled.save()
+        journaled.compact(wait=True)
+        with open('file.json') as f:
+            self.assertIn("BaseModel." + new.id, json.load(f))
+
+
+@unittest.skipUnless(_has_filestorage and type(storage) is FileStorage,
+                     "FileStorage tests only")
+class test_fileStorage_lazy(unittest.TestCase):
+    """ Class to test lazy hydration on reload """
+
+    def setUp(self):
+        """ Save two places and reload them lazily """
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        self.first = Place(city_id="c1")
+        self.second = Place(city_id="c2")
+        storage.new(self.first)
+        storage.new(self.second)
+        storage.save()
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        with patch.dict(os.environ, {"HBNB_FILE_LAZY": "1"}):
+            self.storage = FileStorage()
+        self.storage.reload()
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove('file.json')
+        except OSError:
+            pass
+
+    def test_reload_builds_nothing(self):
+        """ reload() keeps raw records without building instances """
+        self.assertEqual(len(storage._FileStorage__objects), 0)
+
+    def test_get_builds_one(self):
+        """ get() builds only the requested object """
+        obj = self.storage.get(Place, self.first.id)
+        self.assertEqual(obj.id, self.first.id)
+        self.assertIs(self.storage.get("Place", self.first.id), obj)
+        self.assertEqual(len(storage._FileStorage__objects), 1)
+        self.assertIsNone(self.storage.get(Place, "missing"))
+
+    def test_lookup_builds_matches(self):
+        """ lookup() builds only the matching objects """
+        found = self.storage.lookup(Place, "city_id", "c2")
+        self.assertEqual([p.id for p in found], [self.second.id])
+        self.assertEqual(len(storage._FileStorage__objects), 1)
+
+    def test_count_builds_nothing(self):
+        """ count() includes unbuilt records without building them """
+        self.assertEqual(self.storage.count(Place), 2)
+        self.assertEqual(self.storage.count(), 2)
+        self.assertEqual(len(storage._FileStorage__objects), 0)
+
+    def test_iter_all_builds_as_it_goes(self):
+        """ iter_all() builds each object only when it is reached """
+        objects = self.storage.iter_all(Place)
+        next(objects)
+        self.assertEqual(len(storage._FileStorage__objects), 1)
+        next(objects)
+        self.assertEqual(len(storage._FileStorage__objects), 2)
+
+    def test_bulk_upsert_keeps_records_unbuilt(self):
+        """ bulk_upsert() updates unbuilt records in place """
+        self.storage.bulk_upsert(Place, [{"id": self.first.id,
+                                          "city_id": "c9"}])
+        self.assertEqual(len(storage._FileStorage__objects), 0)
+        found = self.storage.lookup(Place, "city_id", "c9")
+        self.assertEqual([p.id for p in found], [self.first.id])
+
+    def test_all_builds_everything(self):
+        """ all() behaves as before for callers that iterate everything """
+        self.assertEqual(len(self.storage.all()), 2)
+        self.assertEqual(len(self.storage.all(Place)), 2)
+
+    def test_save_keeps_unbuilt_records(self):
+        """ save() writes raw records back without building them """
+        self.storage.get(Place, self.first.id)
+        self.storage.save()
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 2)
+        self.assertEqual(len(storage._FileStorage__objects), 1)
+
+
+@unittest.skipUnless(_has_filestorage and type(storage) is FileStorage,
+                     "FileStorage tests only")
+class test_fileStorage_binary(unittest.TestCase):
+    """ Class to test the memory-mapped binary snapshot format """
+
+    def setUp(self):
+        """ Set up a binary, lazy storage over an empty object set """
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        with patch.dict(os.environ, {"HBNB_FILE_FORMAT": "binary",
+                                     "HBNB_FILE_LAZY": "1"}):
+            self.storage = FileStorage()
+
+    def tearDown(self):
+        """ Remove snapshot files """
+        for path in ('file.json', 'file.bin', 'copy.json', 'copy.bin'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def test_save_reload(self):
+        """ Objects survive a binary save and lazy reload """
+        place = Place(city_id="c1", price_by_night=80)
+        self.storage.new(place)
+        self.storage.save()
+        self.assertTrue(binary_snapshot.is_binary('file.bin'))
+        self.assertFalse(os.path.exists('file.json'))
+        del storage.all()['Place.' + place.id]
+        self.storage.reload()
+        self.assertEqual(len(storage._FileStorage__objects), 0)
+        loaded = self.storage.get(Place, place.id)
+        self.assertEqual(loaded.city_id, "c1")
+        self.assertEqual(loaded.price_by_night, 80)
+
+    def test_resave_unbuilt_records(self):
+        """ Records that were never decoded are carried over on save """
+        places = [Place(name=str(i)) for i in range(3)]
+        for place in places:
+            self.storage.new(place)
+        self.storage.save()
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        self.storage.reload()
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(sorted(p.name for p in self.storage.all(Place).values()),
+                         ['0', '1', '2'])
+
+    def test_convert(self):
+        """ Snapshots convert between JSON and binary both ways """
+        place = Place(name="Loft")
+        storage.new(place)
+        storage.save()
+        binary_snapshot.convert('file.json', 'copy.bin')
+        snapshot = binary_snapshot.BinarySnapshot('copy.bin')
+        self.assertEqual(list(snapshot.index), ['Place'])
+        snapshot.close()
+        binary_snapshot.convert('copy.bin', 'copy.json')
+        with open('file.json') as f, open('copy.json') as g:
+            self.assertEqual(json.load(f), json.load(g))
+
+
+@unittest.skipUnless(_has_filestorage and type(storage) is FileStorage,
+                     "FileStorage tests only")
+class test_fileStorage_batch(unittest.TestCase):
+    """ Class to test write coalescing """
+
+    def setUp(self):
+        """ Clear objects before each test """
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove('file.json')
+        except OSError:
+            pass
+
+    def test_batch_persists_once(self):
+        """ save() inside a batch is deferred to the end of the block """
+        with storage.batch():
+            for _ in range(3):
+                new = BaseModel()
+                new.save()
+            self.assertFalse(os.path.exists('file.json'))
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 3)
+
+    def test_nested_begin_commit(self):
+        """ Only the outermost commit() persists """
+        storage.begin()
+        storage.begin()
+        BaseModel().save()
+        storage.commit()
+        self.assertFalse(os.path.exists('file.json'))
+        storage.commit()
+        self.assertTrue(os.path.exists('file.json'))
+
+    def test_batch_without_save(self):
+        """ A batch nobody saved in does not persist """
+        with storage.batch():
+            storage.new(BaseModel())
+        self.assertFalse(os.path.exists('file.json'))
+
+    def test_write_behind(self):
+        """ Write-behind defers saves until flush() or the interval """
+        with patch.dict(os.environ, {"HBNB_WRITE_BEHIND": "3600"}):
+            behind = FileStorage()
+        behind.new(BaseModel())
+        behind.save()
+        self.assertFalse(os.path.exists('file.json'))
+        behind.flush()
+        self.assertTrue(os.path.exists('file.json'))
+
+
+@unittest.skipUnless(_has_filestorage and type(storage) is FileStorage,
+                     "FileStorage tests only")
+class test_fileStorage_shared(unittest.TestCase):
+    """ Class to test several processes sharing the same files """
+
+    def setUp(self):
+        """ Set up a shared storage over an empty object set """
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        self.env = {"HBNB_FILE_SHARED": "1"}
+
+    def tearDown(self):
+        """ Remove storage files at end of tests """
+        for path in ('file.json', 'file.json.log', 'file.json.lock'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def other_process(self, code):
+        """ Run code in a separate interpreter sharing file.json """
+        env = dict(os.environ, **self.env)
+        script = "from models import storage\n" + code
+        subprocess.run([sys.executable, "-c", script], env=env, check=True)
+
+    def check_no_lost_writes(self):
+        """ Both processes' objects end up in the file """
+        with patch.dict(os.environ, self.env):
+            shared = FileStorage()
+        shared.reload()
+        mine = BaseModel()
+        shared.new(mine)
+        shared.save()
+        self.other_process(
+            "from models.base_model import BaseModel\n"
+            "b = BaseModel()\nstorage.new(b)\nstorage.save()\n"
+            "print(b.id)\n")
+        late = BaseModel()
+        shared.new(late)
+        shared.save()
+        reader = subprocess.run(
+            [sys.executable, "-c",
+             "from models import storage\nprint(len(storage.all()))"],
+            env=dict(os.environ, **self.env), check=True,
+            capture_output=True, text=True)
+        self.assertEqual(reader.stdout.split()[-1], "3")
+        self.assertEqual(len(shared.all()), 3)
+
+    def test_no_lost_writes(self):
+        """ A save merges objects saved by another process first """
+        self.check_no_lost_writes()
+
+    def test_no_lost_writes_journal(self):
+        """ Same guarantee when appending to a shared journal """
+        self.env["HBNB_FILE_JOURNAL"] = "1"
+        self.check_no_lost_writes()
+
+    def test_refresh_sees_deletes(self):
+        """ refresh() drops objects another process deleted """
+        with patch.dict(os.environ, self.env):
+            shared = FileStorage()
+        gone = BaseModel()
+        shared.new(gone)
+        shared.save()
+        self.other_process(
+            "storage.delete(storage.all()['BaseModel.{}'])\n"
+            "storage.save()\n".format(gone.id))
+        shared.refresh()
+        self.assertNotIn('BaseModel.' + gone.id, shared.all())
+
+
+@unittest.skipUnless(_has_filestorage and type(storage) is FileStorage,
+                     "FileStorage tests only")
+class test_fileStorage_sharded(unittest.TestCase):
+    """ Class to test the sharded per-class layout """
+
+    def setUp(self):
+        """ Set up a sharded storage over an empty object set """
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        with patch.dict(os.environ, {"HBNB_FILE_LAYOUT": "sharded"}):
+            self.storage = FileStorage()
+
+    def tearDown(self):
+        """ Remove the shard directory """
+        shutil.rmtree('file.shards', ignore_errors=True)
+
+    def test_one_file_per_class(self):
+        """ Each class is saved to its own shard """
+        self.storage.new(Place())
+        self.storage.new(Amenity())
+        self.storage.save()
+        self.assertEqual(sorted(os.listdir('file.shards')),
+                         ['Amenity.json', 'Place.json'])
+
+    def test_save_writes_dirty_shards_only(self):
+        """ Shards without changes are left alone """
+        self.storage.new(Place())
+        self.storage.new(Amenity())
+        self.storage.save()
+        before = os.stat('file.shards/Amenity.json').st_mtime_ns
+        self.storage.new(Place())
+        self.storage.save()
+        self.assertEqual(os.stat('file.shards/Amenity.json').st_mtime_ns,
+                         before)
+        with open('file.shards/Place.json') as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    def test_save_attribute_changes(self):
+        """ A shard changed only through attributes is rewritten """
+        place = Place(name="old")
+        amenity = Amenity(name="wifi")
+        self.storage.new(place)
+        self.storage.new(amenity)
+        self.storage.save()
+        place.name = "renamed"
+        place.amenities = amenity
+        self.storage.save()
+        with open('file.shards/Place.json') as f:
+            saved = json.load(f)["Place." + place.id]
+        self.assertEqual(saved["name"], "renamed")
+        self.assertEqual(saved["amenity_ids"], [amenity.id])
+
+    def test_reload_only_named_classes(self):
+        """ reload(classes) reads only those shards, others on demand """
+        place = Place()
+        amenity = Amenity()
+        self.storage.new(place)
+        self.storage.new(amenity)
+        self.storage.save()
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        storage._FileStorage__loaded.clear()
+        self.storage.reload(["Place"])
+        self.assertEqual(list(storage._FileStorage__objects),
+                         ['Place.' + place.id])
+        self.assertIsNotNone(self.storage.get(Amenity, amenity.id))
+
+    def test_import_reads_shards_on_demand(self):
+        """ Importing models reads no shard, first use reads one """
+        place = Place()
+        self.storage.new(place)
+        self.storage.new(Amenity())
+        self.storage.save()
+        script = ("from models import storage\n"
+                  "from models.place import Place\n"
+                  "loaded = storage._FileStorage__loaded\n"
+                  "print(len(loaded))\n"
+                  "print(storage.get(Place, '{}') is not None)\n"
+                  "print(sorted(loaded))\n").format(place.id)
+        env = dict(os.environ, HBNB_FILE_LAYOUT="sharded")
+        output = subprocess.run([sys.executable, "-c", script], env=env,
+                                capture_output=True, text=True,
+                                check=True).stdout.split("\n")
+        self.assertEqual(output[:3], ["0", "True", "['Place']"])
+        env["HBNB_FILE_PRELOAD"] = "Amenity, Place"
+        output = subprocess.run([sys.executable, "-c", script], env=env,
+                                capture_output=True, text=True,
+                                check=True).stdout.split("\n")
+        self.assertEqual(output[0], "2")
+
+    def test_hash_buckets(self):
+        """ HBNB_FILE_SHARDS splits a class into hash buckets """
+        with patch.dict(os.environ, {"HBNB_FILE_LAYOUT": "sharded",
+                                     "HBNB_FILE_SHARDS": "4"}):
+            bucketed = FileStorage()
+        for _ in range(20):
+            bucketed.new(Place())
+        bucketed.save()
+        names = os.listdir('file.shards')
+        self.assertGreater(len(names), 1)
+        self.assertTrue(all(name.startswith('Place.') for name in names))
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        bucketed.reload()
+        self.assertEqual(len(bucketed.all(Place)), 20)
+
+
+@unittest.skipUnless(_has_filestorage and type(storage) is FileStorage,
+                     "FileStorage tests only")
+class test_fileStorage_columnar(unittest.TestCase):
+    """ Class to test the columnar in-memory store """
+
+    def setUp(self):
+        """ Set up a columnar storage over an empty object set """
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        with patch.dict(os.environ, {"HBNB_FILE_COLUMNAR": "1"}):
+            self.storage = FileStorage()
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove('file.json')
+        except OSError:
+            pass
+
+    def test_column_table_round_trip(self):
+        """ Records come back from the columns unchanged """
+        place = Place(city_id="c1", name="Loft", price_by_night=120,
+                      latitude=1.5, amenity_ids=["a1"])
+        record = place.to_dict()
+        table = ColumnTable(Place)
+        table['Place.' + place.id] = record
+        self.assertEqual(table['Place.' + place.id], record)
+        self.assertEqual(list(table.field("city_id")),
+                         [('Place.' + place.id, "c1")])
+        record["price_by_night"] = "cheap"
+        table['Place.' + place.id] = record
+        self.assertEqual(table['Place.' + place.id]["price_by_night"], "cheap")
+        del table['Place.' + place.id]
+        self.assertEqual(len(table), 0)
+
+    def test_save_folds_objects_into_columns(self):
+        """ Built objects are released after save and rebuilt on demand """
+        place = Place(name="Loft")
+        self.storage.new(place)
+        self.storage.save()
+        self.assertEqual(len(storage._FileStorage__objects), 0)
+        self.assertIs(self.storage.get(Place, place.id), place)
+        place_id = place.id
+        del place
+        rebuilt = self.storage.get(Place, place_id)
+        self.assertEqual(rebuilt.name, "Loft")
+
+    def test_released_object_changes_are_saved(self):
+        """ Changes to a held object still count after it was released """
+        place = Place(name="a")
+        self.storage.new(place)
+        self.storage.save()
+        place.name = "changed"
+        other = Place(name="b")
+        self.storage.new(other)
+        self.storage.save()
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        self.storage.reload()
+        self.assertEqual(self.storage.get(Place, place.id).name, "changed")
+
+    def test_reload_keeps_columns(self):
+        """ reload() stores records in columns without building them """
+        for i in range(3):
+            self.storage.new(Place(city_id="c{}".format(i % 2)))
+        self.storage.save()
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        self.storage.reload()
+        self.assertEqual(len(storage._FileStorage__objects), 0)
+        self.assertIsInstance(storage._FileStorage__pending['Place'],
+                              ColumnTable)
+        self.assertEqual(len(self.storage.lookup(Place, "city_id", "c0")), 2)
+
+
+@unittest.skipUnless(_has_filestorage and type(storage) is FileStorage,
+                     "FileStorage tests only")
+class test_fileStorage_query(unittest.TestCase):
+    """ Class to test query() filtering, ordering and limits """
+
+    def setUp(self):
+        """ Store a few places in two cities """
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        self.places = [Place(city_id="c{}".format(i % 2), name=str(i),
+                             price_by_night=i * 10) for i in range(6)]
+        for place in self.places:
+            storage.new(place)
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove('file.json')
+        except OSError:
+            pass
+
+    def reopen(self, env):
+        """ Save, forget every object and reload in the mode of env """
+        storage.save()
+        for key in list(storage.all().keys()):
+            del storage.all()[key]
+        with patch.dict(os.environ, env):
+            fs = FileStorage()
+        fs.reload()
+        return fs
+
+    def test_indexed_equality(self):
+        """ Equality on a foreign key is answered from the index """
+        result = storage.query(Place, city_id="c1")
+        self.assertEqual(sorted(p.name for p in result), ["1", "3", "5"])
+
+    def test_range_and_in(self):
+        """ Range operators combine with in and foreign key filters """
+        result = storage.query(Place, price_by_night__ge=20,
+                               price_by_night__lt=50)
+        self.assertEqual(sorted(p.name for p in result), ["2", "3", "4"])
+        result = storage.query(Place, city_id__in=["c0", "c9"],
+                               name__in=["0", "1", "2"])
+        self.assertEqual(sorted(p.name for p in result), ["0", "2"])
+        self.assertEqual(storage.query(Place, name__ne="0",
+                                       price_by_night__le=10)[0].name, "1")
+
+    def test_order_and_limit(self):
+        """ Results are ordered, then offset and limit are applied """
+        result = storage.query(Place, order_by="-price_by_night", limit=2)
+        self.assertEqual([p.name for p in result], ["5", "4"])
+        result = storage.query(Place, city_id="c0",
+                               order_by="price_by_night", offset=1)
+        self.assertEqual([p.name for p in result], ["2", "4"])
+
+    def test_unknown_class(self):
+        """ An unknown class matches nothing """
+        self.assertEqual(storage.query("Nope", name="x"), [])
+
+    def test_lazy_builds_only_matches(self):
+        """ Lazily loaded records are filtered before being built """
+        fs = self.reopen({"HBNB_FILE_LAZY": "1"})
+        result = fs.query(Place, price_by_night__gt=30)
+        self.assertEqual(sorted(p.name for p in result), ["4", "5"])
+        self.assertEqual(len(storage._FileStorage__objects), 2)
+
+    def test_columnar_filters_columns(self):
+        """ Columnar records are filtered column by column """
+        fs = self.reopen({"HBNB_FILE_COLUMNAR": "1"})
+        result = fs.query(Place, city_id="c0", price_by_night__gt=0,
+                          order_by="-name")
+        self.assertEqual([p.name for p in result], ["4", "2"])
+        self.assertEqual(len(storage._FileStorage__objects), 2)
+        self.assertEqual(len(fs.query(Place, description="")), 6)
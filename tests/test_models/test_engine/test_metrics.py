@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+""" Module for testing the storage metrics"""
+import math
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from models.amenity import Amenity
+from models import storage
+from models.engine.metrics import (Metrics, MetricsWriter, prometheus_text,
+                                   timed)
+try:
+    from models.engine.file_storage import FileStorage
+    _has_filestorage = True
+except Exception:
+    _has_filestorage = False
+
+
+class test_metrics(unittest.TestCase):
+    """ Class to test Metrics and the Prometheus text format """
+
+    def test_histogram_is_cumulative(self):
+        """ Bucket counts include every faster call """
+        metrics = Metrics(buckets=(0.01, 0.1))
+        for seconds in (0.005, 0.05, 0.5):
+            metrics.observe("save", seconds)
+        save = metrics.snapshot()["save"]
+        self.assertEqual(save["count"], 3)
+        self.assertAlmostEqual(save["seconds"], 0.555)
+        self.assertEqual(save["buckets"], {0.01: 1, 0.1: 2, math.inf: 3})
+
+    def test_timed_counts_errors(self):
+        """ A call that raises is counted as an error and re-raised """
+        class Engine:
+            metrics = Metrics()
+
+            @timed("delete")
+            def delete(self, obj=None):
+                raise KeyError(obj)
+
+        with self.assertRaises(KeyError):
+            Engine().delete("x")
+        delete = Engine.metrics.snapshot()["delete"]
+        self.assertEqual((delete["count"], delete["errors"]), (1, 1))
+
+    def test_prometheus_text(self):
+        """ Histograms get le buckets, _sum and _count lines """
+        metrics = Metrics(buckets=(0.1,))
+        metrics.observe("all", 0.05)
+        text = prometheus_text({"operations": metrics.snapshot(),
+                                "objects": {"Place": 2},
+                                "persisted_bytes": 10}, "FileStorage")
+        for line in ('hbnb_storage_operations_total'
+                     '{engine="FileStorage",op="all"} 1',
+                     'hbnb_storage_operation_seconds_bucket'
+                     '{engine="FileStorage",op="all",le="0.1"} 1',
+                     'hbnb_storage_operation_seconds_bucket'
+                     '{engine="FileStorage",op="all",le="+Inf"} 1',
+                     'hbnb_storage_operation_seconds_count'
+                     '{engine="FileStorage",op="all"} 1',
+                     'hbnb_storage_objects'
+                     '{engine="FileStorage",class="Place"} 2',
+                     'hbnb_storage_persisted_bytes'
+                     '{engine="FileStorage"} 10'):
+            self.assertIn(line, text.splitlines())
+
+
+@unittest.skipUnless(_has_filestorage and type(storage) is FileStorage,
+                     "Runs over FileStorage")
+class test_fileStorageStats(unittest.TestCase):
+    """ Class to test FileStorage.stats() """
+
+    def setUp(self):
+        """ Start from an empty storage and fresh metrics """
+        for obj in list(storage.all().values()):
+            storage.delete(obj)
+        storage.metrics.reset()
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove('file.json')
+        except OSError:
+            pass
+
+    def test_stats(self):
+        """ Calls, objects per class and file size are reported """
+        amenity = Amenity(name="Wifi")
+        storage.new(amenity)
+        storage.save()
+        storage.all(Amenity)
+        stats = storage.stats()
+        for op in ("new", "save", "persist", "all"):
+            self.assertEqual(stats["operations"][op]["count"], 1, op)
+        self.assertEqual(stats["objects"]["Amenity"], 1)
+        self.assertEqual(stats["persisted_bytes"],
+                         os.path.getsize("file.json"))
+
+    def test_stats_has_no_side_effects(self):
+        """ stats() reads what is in memory, it never refreshes """
+        with patch.object(FileStorage, "refresh") as refresh:
+            storage.stats()
+        refresh.assert_not_called()
+
+    def test_one_writer_per_file(self):
+        """ A second writer of the same file is not started """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "hbnb.prom")
+            before = threading.active_count()
+            writers = [MetricsWriter(storage, path, interval=3600).start()
+                       for _ in range(2)]
+            self.assertEqual(threading.active_count(), before + 1)
+            for writer in writers:
+                writer.stop()
+
+    def test_writer(self):
+        """ The writer leaves a complete Prometheus file behind """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "hbnb.prom")
+            MetricsWriter(storage, path, interval=3600).write()
+            with open(path) as f:
+                text = f.read()
+            self.assertEqual(os.listdir(tmp), ["hbnb.prom"])
+        self.assertIn('hbnb_storage_objects{engine="FileStorage",'
+                      'class="Amenity"} 0', text)